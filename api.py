@@ -0,0 +1,194 @@
+"""Read-only JSON API for member profiles.
+
+    uvicorn api:app --port 8000 --workers 2
+    python api.py --port 8000 --db karwan_tijarat.db
+
+Endpoints (GET or HEAD):
+
+    /profiles/{id}              profile JSON
+    /profiles/{id}/qr.png       profile QR code
+    /profiles/{id}/profile.pdf  profile PDF
+    /search?q=&country=&city=&profession=&limit=&cursor=
+                                one page of results plus next_cursor
+
+Every response carries an ETag derived from the profile row's content (or
+the page's), and a matching If-None-Match gets an empty 304, so partner
+sites and scanners revalidate without re-downloading or re-rendering.
+Handlers are async; SQLite and rendering run on a bounded thread pool,
+each thread with its own pooled connection.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import database
+import pdf_generator
+import profile_cache
+
+API_DB_THREADS = 8
+SEARCH_MAX_LIMIT = 100
+PROFILE_MAX_AGE = 60
+QR_MAX_AGE = 7 * 24 * 3600  # a QR only encodes the profile URL, so it never changes
+
+_executor = ThreadPoolExecutor(max_workers=API_DB_THREADS, thread_name_prefix="api")
+_PROFILE_ROUTE = re.compile(r"^/profiles/([^/]+?)(/qr\.png|/profile\.pdf)?/?$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _etag(*parts):
+    digest = hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _row_etag(profile, kind):
+    return _etag(kind, [profile[c] for c in database.PROFILE_COLUMNS])
+
+
+def _profile(profile_id):
+    profile = profile_cache.get_profile(profile_id)
+    if profile is None:
+        raise HTTPError(404, f"No profile {profile_id}")
+    return profile
+
+
+def _profile_json(profile_id):
+    profile = _profile(profile_id)
+    body = json.dumps(dict(profile), ensure_ascii=False).encode()
+    return body, "application/json", _row_etag(profile, "json"), PROFILE_MAX_AGE
+
+
+def _profile_qr(profile_id):
+    view = profile_cache.get_profile_view(profile_id)
+    if view is None:
+        raise HTTPError(404, f"No profile {profile_id}")
+    return view.qr, "image/png", _etag("qr", profile_id), QR_MAX_AGE
+
+
+def _profile_pdf(profile_id, if_none_match):
+    profile = _profile(profile_id)
+    etag = _row_etag(profile, "pdf" + str(pdf_generator.PDF_TEMPLATE_VERSION))
+    if _etag_matches(if_none_match, etag):
+        return None, "application/pdf", etag, PROFILE_MAX_AGE  # skip rendering
+    qr = profile_cache.get_profile_view(profile_id).qr
+    return pdf_generator.get_profile_pdf(dict(profile), qr), "application/pdf", etag, PROFILE_MAX_AGE
+
+
+def _encode_cursor(cursor):
+    return None if cursor is None else f"{cursor[0]!r}:{cursor[1]}"
+
+
+def _decode_cursor(text):
+    try:
+        score, rowid = text.rsplit(":", 1)
+        return float(score), int(rowid)
+    except ValueError:
+        raise HTTPError(400, "Invalid cursor")
+
+
+def _search(query):
+    params = {k: v[0] for k, v in parse_qs(query).items()}
+    try:
+        limit = min(max(int(params.get("limit", 12)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        raise HTTPError(400, "limit must be an integer")
+    cursor = _decode_cursor(params["cursor"]) if params.get("cursor") else None
+    filters = {k: params[k] for k in database.FILTER_COLUMNS if params.get(k)}
+    rows, next_cursor = database.search_profiles_page(params.get("q", ""), after=cursor,
+                                                      page_size=limit, filters=filters)
+    body = json.dumps({
+        "results": [row._asdict() for row in rows],
+        "next_cursor": _encode_cursor(next_cursor),
+    }, ensure_ascii=False).encode()
+    return body, "application/json", _etag("search", body.decode()), PROFILE_MAX_AGE
+
+
+def _route(method, path, query, if_none_match):
+    # Runs on the thread pool; returns (body, content type, etag, max age)
+    if method not in ("GET", "HEAD"):
+        raise HTTPError(405, "Read-only API: use GET")
+    if path.rstrip("/") == "/search":
+        return _search(query)
+    match = _PROFILE_ROUTE.match(path)
+    if not match:
+        raise HTTPError(404, "Not found")
+    profile_id, suffix = match.groups()
+    if suffix == "/qr.png":
+        return _profile_qr(profile_id)
+    if suffix == "/profile.pdf":
+        return _profile_pdf(profile_id, if_none_match)
+    return _profile_json(profile_id)
+
+
+async def _send(send, status, headers, body=b""):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.encode(), v.encode()) for k, v in headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            database.migrate_db()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    headers = dict(scope["headers"])
+    if_none_match = headers.get(b"if-none-match", b"").decode()
+    loop = asyncio.get_running_loop()
+    try:
+        body, content_type, etag, max_age = await loop.run_in_executor(
+            _executor, _route, scope["method"], scope["path"],
+            scope.get("query_string", b"").decode(), if_none_match)
+    except HTTPError as e:
+        return await _send(send, e.status, [("content-type", "application/json")],
+                           json.dumps({"error": str(e)}).encode())
+
+    cache_headers = [("etag", etag), ("cache-control", f"public, max-age={max_age}")]
+    if _etag_matches(if_none_match, etag):
+        return await _send(send, 304, cache_headers)
+    response_headers = cache_headers + [("content-type", content_type),
+                                        ("content-length", str(len(body)))]
+    await _send(send, 200, response_headers, b"" if scope["method"] == "HEAD" else body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the read-only profile API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db", default=database.DB_PATH)
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("Serving the API needs an ASGI server (pip install uvicorn)")
+    database.DB_PATH = args.db
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
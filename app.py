@@ -3,149 +3,65 @@ import streamlit as st
 # ✅ Must be the first Streamlit command
 st.set_page_config(page_title="Karwan-e-Tijarat", layout="centered")
 
-import sqlite3
-from io import BytesIO
+# reportlab, phonenumbers and geopy are imported inside the functions
+# that use them, so a plain page view doesn't pay for loading them.
+import os
+import tempfile
 import uuid
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-import qrcode
-import re
-import pandas as pd
-import base64
-import phonenumbers
-from phonenumbers import NumberParseException
-import pycountry
-from geopy.geocoders import Nominatim
-
-from database import init_db, migrate_db, get_profile_by_id, get_profile_by_email, save_profile, get_all_profiles, search_profiles
+
+import booklet
+import emails
+import gazetteer
+import jobs
+import metrics
+import pdf_generator
+import profile_cache
+import qr_generator
+import reference_data
+from geocoding import geocode
+from bulk_import import import_members, write_error_report
+from validation import validate_email, get_country_phone_code, format_phone
+from database import init_db, migrate_db, get_profile_by_email, save_profile, search_profiles_page, count_profiles, facet_counts, check_facets, email_conflicts, vacuum_db, get_profiles_by_ids, export_profiles, EXPORT_FORMATS
 
 DB_PATH = "karwan_tijarat.db"
+SEARCH_PAGE_SIZE = 12
+NEARBY_MAX_RESULTS = 60
+SLOW_CALLS_SHOWN = 10
+JOB_POLL_SECONDS = 0.5
+FACET_CHIPS = 12
+
+metrics.begin_run(st.session_state.setdefault("metrics_session", uuid.uuid4().hex))
+emails.begin_run()
 
 # ✅ Initialize database with migrations
 init_db()
 migrate_db()
 
-def validate_email(email):
-    return re.match(r"[^@]+@[^@]+\.[^@]+", email)
-
-def get_country_phone_code(country_name):
-    try:
-        country = pycountry.countries.get(name=country_name)
-        return f"+{phonenumbers.country_code_for_region(country.alpha_2)}"
-    except:
-        return "+92"  # Default to Pakistan
-
-def format_phone(phone_str, country_name):
-    if not phone_str: return ''
-    try:
-        country_code = get_country_phone_code(country_name)
-        if not phone_str.startswith('+'):
-            phone_str = f"{country_code}{phone_str.lstrip('0')}"
-        parsed = phonenumbers.parse(phone_str, None)
-        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
-    except NumberParseException:
-        return phone_str
-
-from datetime import datetime
-
-def generate_custom_profile_id(full_name):
-    from database import get_all_profiles
-    df = get_all_profiles()
-    seq = len(df) + 1  # Sequence number
-    initials = ''.join([w[0].upper() for w in full_name.split() if w])[:3]
-    date_code = datetime.now().strftime("%d%m%y")
-    return f"{seq}-{initials}-{date_code}"
-
 def generate_pdf(profile_data, qr_img_bytes):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    
-    p.setFont("Helvetica-Bold", 18)
-    p.drawCentredString(300, 780, "Karwan-e-Tijarat Profile")
-    p.line(50, 770, 550, 770)
-    
-    if qr_img_bytes:
-        p.drawImage(ImageReader(BytesIO(qr_img_bytes)), 400, 600, width=120, height=120)
-    
-    y = 700
-    line_spacing = 18
-    p.setFont("Helvetica", 12)
-    
-    fields = [
-        ("Name", profile_data.get('full_name', '')),
-        ("Email", profile_data.get('email', '')),
-        ("Location", f"{profile_data.get('city', '')}, {profile_data.get('country', '')}"),
-        ("Primary Phone", profile_data.get('primary_phone', '')),
-        ("Secondary Phone", profile_data.get('secondary_phone', '')),
-        ("Profession", profile_data.get('profession', '')),
-        ("Expertise", profile_data.get('expertise', '')),
-        ("How I Can Help", profile_data.get('how_to_help', '')),
-        ("Help Needed", profile_data.get('help_needed', '')),
-        ("Business URL", profile_data.get('business_url', ''))
-    ]
-    
-    for label, value in fields:
-        if value:
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(50, y, f"{label}:")
-            text = p.beginText(150, y)
-            text.setFont("Helvetica", 12)
-
-        # ✅ Wrap long text into multiple lines (max width ~380px)
-        lines = str(value).split('\n')
-        for line in lines:
-            wrapped = []
-            while len(line) > 80:
-                wrapped.append(line[:80])
-                line = line[80:]
-            wrapped.append(line)
-
-            for subline in wrapped:
-                if y < 50:
-                    p.showPage()
-                    y = 750
-                    p.setFont("Helvetica", 12)
-                    p.setFont("Helvetica-Bold", 12)
-                    p.drawString(50, y, f"{label}:")
-                    y -= line_spacing
-                    p.setFont("Helvetica", 12)
-                text.textLine(subline)
-                y -= line_spacing
-                
-        p.drawText(text)
-        y -= 6  # Extra spacing between fields
-    p.save()
-    buffer.seek(0)
-    return buffer.getvalue()
+    return pdf_generator.get_profile_pdf(profile_data, qr_img_bytes)
 
 def generate_qr_code(url):
     try:
-        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=4)
-        qr.add_data(url)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buf = BytesIO()
-        img.save(buf)
-        return buf.getvalue()
+        return qr_generator.generate_qr_code(url, error_correction="H")
     except Exception as e:
         st.error(f"QR generation failed: {e}")
         return None
 
 # Profile View Handler
 query_params = st.query_params
-profile_id = query_params.get("profile_id", [None])[0]
+profile_id = query_params.get("profile_id")
 
 if profile_id:
-    profile = get_profile_by_id(profile_id)
-    if profile:
+    # Snapshot cache: scan bursts for one profile don't each hit SQLite and
+    # re-encode the QR.
+    view = profile_cache.get_profile_view(profile_id)
+    if view:
+        profile = view.profile
         st.title(f"Profile: {profile['full_name']}")
         with st.container():
             col1, col2 = st.columns([1, 3])
             with col1:
-                qr_img = generate_qr_code(f"https://karwan-e-tijarat.streamlit.app/?profile_id={profile_id}")
-                if qr_img:
-                    st.image(qr_img, width=200)
+                st.image(view.qr, width=200)
             with col2:
                 st.markdown(f"**Profession:** {profile['profession']}")
                 st.markdown(f"**Location:** {profile['city']}, {profile['country']}")
@@ -162,6 +78,27 @@ if profile_id:
         
         with st.expander("Help Needed"):
             st.write(profile['help_needed'] or "Not specified")
+
+        if profile['help_needed']:
+            from matching import suggest_connections  # scipy is only loaded for profile views
+            st.subheader("🤝 Suggested connections")
+            # label -> (country, city) filters; no city option when it is
+            # blank or the same as the country (e.g. Singapore)
+            scopes = {"Anywhere": (None, None)}
+            if profile['country']:
+                scopes[f"In {profile['country']}"] = (profile['country'], None)
+            if profile['city'] and profile['city'] != profile['country']:
+                scopes[f"In {profile['city']}"] = (profile['country'], profile['city'])
+            scope = st.radio("Show members from", list(scopes), horizontal=True)
+            country, city = scopes[scope]
+            suggestions = suggest_connections(profile, country=country, city=city)
+            for match in suggestions:
+                other = profile_cache.get_profile(match.profile_id)
+                if other:
+                    st.markdown(f"**[{other['full_name']}](https://karwan-e-tijarat.streamlit.app/?profile_id={other['id']})** "
+                                f"— {other['profession']}, {other['city']}, {other['country']}")
+            if not suggestions:
+                st.caption("No matching members yet")
         
         st.stop()
 
@@ -193,8 +130,7 @@ if mode == "Create New":
     email_check = st.text_input("Enter Email to Check Availability")
 
     if email_check:
-        existing = get_profile_by_email(email_check)
-        if existing:
+        if emails.email_exists(email_check):
             st.warning("⚠️ Email already exists! Please use 'Update Existing' mode.")
         else:
             st.success("✅ Email is available. You can proceed to create profile.")
@@ -203,22 +139,24 @@ if mode == "Create New":
         
 form = st.form(key='profile_form')
 with form:
-    country_list = sorted([c.name for c in pycountry.countries if hasattr(c, 'name')])
+    country_list = reference_data.country_names()
     default_country = profile_data.get('country', 'Pakistan')
     
     col1, col2 = form.columns(2)
     with col1:
         country = form.selectbox("Country*", country_list, index=country_list.index(default_country) if default_country in country_list else 0)
     with col2:
-        geolocator = Nominatim(user_agent="karwan_tijarat")
-        try:
-            location = geolocator.geocode(country)
-            if location:
-                city = form.text_input("City*", value=profile_data.get('city', ''))
-            else:
-                city = form.text_input("City*", value=profile_data.get('city', ''))
-        except:
-            city = form.text_input("City*", value=profile_data.get('city', ''))
+        # Offline city list: no network call on rerun, and the selectbox
+        # filters as you type while still accepting unlisted cities.
+        default_city = profile_data.get('city', '')
+        city_options = gazetteer.city_names(default_country)
+        local_cities = set(city_options)
+        city_options += [c for c in gazetteer.city_names() if c not in local_cities]
+        if default_city and default_city not in city_options:
+            city_options.insert(0, default_city)
+        city = form.selectbox("City*", city_options,
+                              index=city_options.index(default_city) if default_city else None,
+                              placeholder="Start typing your city", accept_new_options=True) or ''
 
     phone_code = get_country_phone_code(country)
     col1, col2 = form.columns(2)
@@ -234,7 +172,7 @@ with form:
 email_exists = False
 if mode == "Create New":
     if email:
-        if get_profile_by_email(email):
+        if emails.email_exists(email):
             email_exists = True
             st.warning("⚠️ This email already exists. Try 'Update Existing' mode.")
 
@@ -262,14 +200,14 @@ if submitted:
         errors.append("Missing required fields (marked with *)")
     elif not validate_email(email):
         errors.append("Invalid email format")
-    elif mode == "Create New" and get_profile_by_email(email):
+    elif mode == "Create New" and emails.email_exists(email):
         errors.append("Email already exists (use Update mode)")
     
     if errors:
         for error in errors: st.error(error)
     else:
         profile_data = {
-            'id': profile_data.get('id', generate_custom_profile_id(full_name)),
+            'id': profile_data.get('id'),  # None: save_profile allocates a new one
             'full_name': full_name,
             'email': email,
             'city': city,
@@ -284,87 +222,300 @@ if submitted:
         }
         
         if save_profile(profile_data):
-            st.success("Profile saved successfully!")
-            base_url = "https://karwan-e-tijarat.streamlit.app/"  # Adjust if deploying elsewhere
+            geocode(city, country)  # warms the location cache in the background
             profile_url = f"https://karwan-e-tijarat.streamlit.app/?profile_id={profile_data['id']}"
+            # QR and PDF render on the job pool; the section below picks
+            # them up when ready instead of holding this script thread.
+            st.session_state["saved_profile"] = {
+                'id': profile_data['id'],
+                'full_name': full_name,
+                'url': profile_url,
+                'job': jobs.submit_profile_assets(profile_data, profile_url),
+            }
+            st.success("Profile saved successfully!")
+        else:
+            # Typically another session registered the same email first
+            st.error("Could not save your profile - if this email is already registered, use Update mode")
 
-            col1, col2 = st.columns(2)
-            with col1:
-                qr_img = generate_qr_code(profile_url)
-                if qr_img:
-                    st.image(qr_img, caption="Share Profile QR", width=200)
-            with col2:
-                st.markdown("**Shareable Profile URL:**")
-                st.code(profile_url)
-
-            pdf_bytes = generate_pdf(profile_data, qr_img)
-            st.download_button(
-                "📄 Download Profile PDF",
-                data=pdf_bytes,
-                file_name=f"{full_name}_profile.pdf",
-                mime="application/pdf"
-            )
-
-            # ✅ Show created profile before refreshing
-            st.success("🎉 Profile created successfully!")
-            st.markdown(f"🔗 [View Your Profile](https://karwan-e-tijarat.streamlit.app/?profile_id={profile_data['id']})")
-
-            # Optional: Delay for visibility before refresh
-            import time
-            time.sleep(3)
-
-            st.info("✅ You can now update another profile or use the menu above.")
-            if st.button("Reset Form"):
-                st.session_state["form_reset"] = True
+def show_saved_profile(saved):
+    job = jobs.status(saved['job'])
+    col1, col2 = st.columns(2)
+    with col1:
+        if job.state == "done":
+            st.image(job.result.qr, caption="Share Profile QR", width=200)
+    with col2:
+        st.markdown("**Shareable Profile URL:**")
+        st.code(saved['url'])
+
+    if job.state == "done":
+        st.download_button(
+            "📄 Download Profile PDF",
+            data=job.result.pdf,
+            file_name=f"{saved['full_name']}_profile.pdf",
+            mime="application/pdf"
+        )
+    elif job.state == "failed":
+        st.error(f"Could not generate your QR code and PDF: {job.error}")
+    elif job.state == "unknown":
+        st.info("Your QR code and PDF have expired; open your profile page to download them again.")
+    else:
+        st.info("⏳ Preparing your QR code and PDF…")
+
+    st.markdown(f"🔗 [View Your Profile]({saved['url']})")
+    return job.state
+
+if "saved_profile" in st.session_state:
+    saved = st.session_state["saved_profile"]
+    if jobs.status(saved['job']).state in ("queued", "running"):
+        # Re-run only this section until the job finishes, then the whole
+        # page once so the polling stops.
+        @st.fragment(run_every=JOB_POLL_SECONDS)
+        def poll_saved_profile():
+            if show_saved_profile(saved) not in ("queued", "running"):
                 st.rerun()
+        poll_saved_profile()
+    else:
+        show_saved_profile(saved)
+
+    st.info("✅ You can now update another profile or use the menu above.")
+    if st.button("Reset Form"):
+        st.session_state["form_reset"] = True
+        st.rerun()
 
 # Admin Section
 if st.secrets.get("ADMIN_PASSWORD"):
     with st.expander("🔒 Admin Tools"):
         admin_pass = st.text_input("Enter Admin Password", type="password")
         if admin_pass == st.secrets["ADMIN_PASSWORD"]:
-            if st.button("Export Full Database to CSV"):
-                df = get_all_profiles()
-                if not df.empty:
-                    csv = df.to_csv(index=False)
-                    b64 = base64.b64encode(csv.encode()).decode()
-                    st.markdown(f'<a href="data:file/csv;base64,{b64}" download="karwan_profiles.csv">📥 Download CSV</a>', unsafe_allow_html=True)
+            upload = st.file_uploader("Bulk import members (CSV or XLSX)", type=["csv", "xlsx"])
+            if upload and st.button("Import Members"):
+                progress = st.empty()
+
+                def show_progress(rows, new, updated, failed):
+                    progress.write(f"{rows} rows read: {new} new, {updated} updated, {failed} rejected")
+
+                try:
+                    report = import_members(upload, filename=upload.name, on_progress=show_progress)
+                except Exception as e:
+                    # Unreadable file, missing openpyxl, or a database failure
+                    st.error(f"Import failed: {e}")
+                else:
+                    st.success(f"Imported {report.inserted} new and {report.updated} updated members in {report.seconds:.1f}s")
+                    if report.errors:
+                        st.warning(f"{report.failed} rows were rejected")
+                        st.download_button("📄 Download Error Report", data=write_error_report(report.errors),
+                                           file_name="import_errors.csv", mime="text/csv")
+
+            if count_profiles("") == 0:
+                st.warning("Database is empty")
+            else:
+                export_format = st.selectbox("Export format", list(EXPORT_FORMATS))
+                mime, extension = EXPORT_FORMATS[export_format]
+                # The export is only built when the button is clicked, on a
+                # separate thread, into a temp file that Streamlit then
+                # reads into memory to serve.
+                st.download_button(
+                    f"📥 Export Full Database ({export_format.upper()})",
+                    data=lambda: export_profiles(export_format),
+                    file_name=f"karwan_profiles{extension}",
+                    mime=mime
+                )
+
+                # Printed directory for an event, rendered on a process pool
+                # in a separate process, then offered for download
+                booklet_country = st.selectbox("Directory booklet for", ["All countries"] + [
+                    country for country, _ in facet_counts("country")])
+                booklet_zip = st.toggle("Separate PDFs in a ZIP")
+                if st.button("Build directory booklet"):
+                    progress = st.progress(0.0, text="Rendering profiles...")
+                    filters = {'country': None if booklet_country == "All countries" else booklet_country}
+                    with tempfile.TemporaryDirectory() as tmp:
+                        out = os.path.join(tmp, "karwan_directory.zip" if booklet_zip else "karwan_directory.pdf")
+                        report = booklet.build_in_subprocess(
+                            out, filters=filters, as_zip=booklet_zip,
+                            on_progress=lambda done, total: progress.progress(
+                                done / total if total else 1.0, text=f"{done}/{total} profiles"))
+                        with open(out, "rb") as f:
+                            st.download_button(f"📘 Download booklet ({report.profiles} profiles, {report.pages} pages)",
+                                               data=f.read(), file_name=os.path.basename(out),
+                                               mime="application/zip" if booklet_zip else "application/pdf")
+
+            if st.button("Check facet counts"):
+                # Rebuilds the search chips' counts from scratch and repairs any drift
+                diffs = check_facets(repair=True)
+                if diffs:
+                    st.warning(f"Repaired {len(diffs)} facet counts")
+                    st.dataframe([{'facet': f, 'value': " / ".join(k), 'maintained': kept, 'actual': actual}
+                                  for f, k, kept, actual in diffs], hide_index=True)
                 else:
-                    st.warning("Database is empty")
+                    st.success("Facet counts match the members table")
+
+            if st.button("Check duplicate emails"):
+                # Older databases may hold one email twice, differing only by
+                # case; both profiles are kept until an admin merges them
+                conflicts = email_conflicts()
+                if conflicts:
+                    st.warning(f"{len(conflicts)} emails belong to more than one member - merge them by hand")
+                    st.dataframe([{'email': email, 'members': ", ".join(ids)} for email, ids in conflicts],
+                                 hide_index=True)
+                else:
+                    st.success("Every email belongs to one member")
+
+            invite_email = st.text_input("Invite a member to log in", placeholder="member's email")
+            if invite_email and st.button("Create invite code"):
+                import credentials  # the scrypt pool is only started for admin or login use
+                code = credentials.create_invite(invite_email)
+                if code:
+                    st.success("Send this one-time code to the member; it expires in "
+                               f"{credentials.INVITE_TTL_SECONDS // 86400} days")
+                    st.code(code)
+                else:
+                    st.error("No member has this email, or it already has a login")
+
+            if st.button("Compact database"):
+                # Reclaims space left by deleted rows; rebuilds the search
+                # index, whose rowids VACUUM may renumber
+                vacuum_db()
+                st.success("Database compacted and search index rebuilt")
+
+            st.markdown("#### 📈 Metrics")
+            metrics.enable(st.toggle("Record call timings", value=metrics.enabled()))
+            metrics.slow_threshold_ms = st.number_input(
+                "Slow-call threshold (ms)", min_value=1.0, value=float(metrics.slow_threshold_ms), step=10.0)
+            stats = metrics.snapshot()
+            if stats:
+                st.dataframe(stats, hide_index=True, column_config={
+                    c: st.column_config.NumberColumn(format="%.2f")
+                    for c in ("total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms")})
+                this_run = metrics.current_run()
+                st.caption("This rerun so far: " + ", ".join(
+                    f"{category} {calls} calls / {ms:.1f} ms" for category, (calls, ms) in this_run.items()))
+                if metrics.recent_runs:
+                    st.caption("Recent reruns")
+                    st.dataframe([{'started': r.started.strftime("%H:%M:%S"), 'calls': r.calls,
+                                   'ms': round(r.ms, 1),
+                                   **{c: round(ms, 1) for c, (_, ms) in r.by_category.items()}}
+                                  for r in reversed(metrics.recent_runs)], hide_index=True)
+                for slow in list(metrics.slow_log)[:-SLOW_CALLS_SHOWN - 1:-1]:
+                    st.markdown(f"🐢 **{slow.name}**: {slow.ms:.1f} ms at {slow.when:%H:%M:%S}")
+                    for sql, plan in slow.statements:
+                        st.code(sql + ("\n-- " + "\n-- ".join(plan) if plan else ""), language="sql")
+                metrics_col, reset_col = st.columns(2)
+                with metrics_col:
+                    st.download_button("📤 Prometheus metrics", data=metrics.render_prometheus(),
+                                       file_name="karwan_metrics.prom", mime="text/plain")
+                with reset_col:
+                    if st.button("Reset metrics"):
+                        metrics.reset()
+                        st.rerun()
+            elif metrics.enabled():
+                st.caption("No calls recorded yet.")
 
 # Search Section
-st.divider()
-st.subheader("🔍 Search Professionals")
-search_term = st.text_input("Search by name, profession, expertise, or location")
-if st.button("Search"):
-    results = search_profiles(search_term)
-    if not results.empty:
-        st.write(f"Found {len(results)} profiles:")
-        columns = st.columns(3)
-        for idx, (_, row) in enumerate(results.iterrows()):
-            with columns[idx % 3]:
-                with st.container(border=True):
-                    st.markdown(f"### {row['full_name']}")
-                    st.caption(f"**{row['profession']}**")
-                    st.write(f"📍 {row['city']}, {row['country']}")
-                    with st.expander("Details"):
-                        st.write(f"**Expertise:** {row['expertise']}")
-                        st.write(f"**Contact:** {row['email']}")
-                        if row['business_url']:
-                            st.markdown(f"🌐 [Visit Business Website]({row['business_url']})")
+def render_profile_card(row, caption=None):
+    with st.container(border=True):
+        st.markdown(f"### {row.full_name}")
+        st.caption(f"**{row.profession}**")
+        st.write(f"📍 {row.city}, {row.country}" + (f" · {caption}" if caption else ""))
+        with st.expander("Details"):
+            st.write(f"**Expertise:** {row.expertise}")
+            st.write(f"**Contact:** {row.email}")
+            if row.business_url:
+                st.markdown(f"🌐 [Visit Business Website]({row.business_url})")
 
 # Add this below to allow going to profile:
-                            profile_link = f"https://karwan-e-tijarat.streamlit.app?profile_id={row['id']}"
-                            st.markdown(f"🔗 [View Profile Page]({profile_link})")
-
-                    if st.button("Download PDF", key=f"pdf_{row['id']}"):
-                        pdf_bytes = generate_pdf(row.to_dict(), generate_qr_code(f"https://karwan-e-tijarat.streamlit.app?profile_id={row['id']}"))
-                        st.download_button(
-                            label="📄 Download Profile PDF",
-                            data=pdf_bytes,
-                            file_name=f"{row['full_name']}_profile.pdf",
-                            mime="application/pdf",
-                            key=f"dl_{row['id']}"
-                        )
-    else:
-        st.warning("No matching profiles found")
+                profile_link = f"https://karwan-e-tijarat.streamlit.app?profile_id={row.id}"
+                st.markdown(f"🔗 [View Profile Page]({profile_link})")
+
+        if st.button("Download PDF", key=f"pdf_{row.id}"):
+            pdf_bytes = generate_pdf(row._asdict(), generate_qr_code(f"https://karwan-e-tijarat.streamlit.app?profile_id={row.id}"))
+            st.download_button(
+                label="📄 Download Profile PDF",
+                data=pdf_bytes,
+                file_name=f"{row.full_name}_profile.pdf",
+                mime="application/pdf",
+                key=f"dl_{row.id}"
+            )
+
+st.divider()
+st.subheader("🔍 Search Professionals")
+search_mode = st.radio("Search by", ["Keyword", "Near a city"], horizontal=True)
+
+if search_mode == "Keyword":
+    search_term = st.text_input("Search by name, profession, expertise, or location")
+
+    # Drill-down chips. Counts come from the trigger-maintained facet
+    # tables, so drawing them costs the same at any directory size.
+    def facet_pills(label, counts, key):
+        counts = dict(counts)
+        return st.pills(label, list(counts), format_func=lambda v: f"{v} · {counts[v]}", key=key)
+
+    filters = {'country': facet_pills("Country", facet_counts("country", limit=FACET_CHIPS), "facet_country")}
+    if filters['country']:
+        filters['city'] = facet_pills("City", facet_counts("city", country=filters['country'], limit=FACET_CHIPS),
+                                      f"facet_city_{filters['country']}")
+    filters['profession'] = facet_pills("Profession", facet_counts("profession", limit=FACET_CHIPS),
+                                        "facet_profession")
+    filters = {k: v for k, v in filters.items() if v}
+
+    if st.button("Search"):
+        # Keep the active search in session state so paging and the per-card
+        # PDF buttons don't lose the results on rerun.
+        st.session_state["search_term"] = search_term
+        st.session_state["search_cursors"] = [None]
+    if filters != st.session_state.get("search_filters", {}):
+        # A chip was toggled: filter the current search (or everyone)
+        st.session_state["search_filters"] = filters
+        st.session_state.setdefault("search_term", "")
+        st.session_state["search_cursors"] = [None]
+
+    if "search_term" in st.session_state:
+        active_term = st.session_state["search_term"]
+        cursors = st.session_state["search_cursors"]
+        rows, next_cursor = search_profiles_page(active_term, after=cursors[-1], page_size=SEARCH_PAGE_SIZE,
+                                                 filters=filters)
+        if rows:
+            total = count_profiles(active_term, filters)
+            page_no = len(cursors)
+            st.write(f"Found {total} profiles (page {page_no} of {-(-total // SEARCH_PAGE_SIZE)}):")
+            columns = st.columns(3)
+            for idx, row in enumerate(rows):
+                with columns[idx % 3]:
+                    render_profile_card(row)
+
+            prev_col, next_col = st.columns(2)
+            with prev_col:
+                if page_no > 1 and st.button("◀ Previous page"):
+                    cursors.pop()
+                    st.rerun()
+            with next_col:
+                if next_cursor is not None and st.button("Next page ▶"):
+                    cursors.append(next_cursor)
+                    st.rerun()
+        else:
+            st.warning("No matching profiles found")
+else:
+    import nearby
+    near_country = st.selectbox("Country", reference_data.country_names(), key="near_country")
+    near_city = st.selectbox("City", gazetteer.city_names(near_country), index=None,
+                             placeholder="Any city (country capital)", key="near_city")
+    radius_km = st.slider("Within (km)", min_value=10, max_value=2000, value=100, step=10)
+    if st.button("Find members nearby"):
+        st.session_state["near_query"] = (near_city or "", near_country, radius_km)
+
+    if "near_query" in st.session_state:
+        city, country, radius = st.session_state["near_query"]
+        found = nearby.members_near(city, country, radius_km=radius, k=NEARBY_MAX_RESULTS)
+        if found is None:
+            st.info("That place isn't located yet; try again in a few seconds.")
+        elif found:
+            profiles = {p.id: p for p in get_profiles_by_ids([n.profile_id for n in found])}
+            place = city or f"the capital of {country}"
+            shown = "closest " if len(found) == NEARBY_MAX_RESULTS else ""
+            st.write(f"{shown}{len(found)} members within {radius} km of {place}:")
+            columns = st.columns(3)
+            for idx, near in enumerate(n for n in found if n.profile_id in profiles):
+                with columns[idx % 3]:
+                    render_profile_card(profiles[near.profile_id], f"{near.distance_km:,.0f} km away")
+        else:
+            st.warning(f"No members within {radius} km")
@@ -1,51 +1,93 @@
 import streamlit as st
-import sqlite3
-from database import DB_PATH
+import credentials
 
 def check_login():
-    if 'logged_in' not in st.session_state:
-        st.session_state.logged_in = False
+    # A signed token in session state; after the first check of a token this
+    # is an HMAC and a cache lookup, with no database round trip
+    email = credentials.check_token(st.session_state.get('session_token'))
+    st.session_state.logged_in = email is not None
+    if email is not None:
+        st.session_state.user_email = email
+    return st.session_state.logged_in
+
+def logout():
+    credentials.revoke(st.session_state.pop('session_token', None))
+    st.session_state.logged_in = False
+    st.session_state.pop('user_email', None)
+
+def account_section():
+    st.write(f"Logged in as {st.session_state.user_email}")
+    with st.form("Change password"):
+        current = st.text_input("Current password", type="password")
+        password = st.text_input("New password", type="password")
+        confirm_password = st.text_input("Confirm new password", type="password")
+        if st.form_submit_button("Change password"):
+            email = st.session_state.user_email
+            if password != confirm_password:
+                st.error("Passwords don't match")
+            else:
+                try:
+                    verified = credentials.login(email, current, client=st.context.ip_address)
+                    if verified:
+                        credentials.set_password(email, password)
+                except credentials.LoginThrottled as e:
+                    st.error(str(e))
+                else:
+                    if verified:
+                        # The new hash invalidates every token issued before it
+                        logout()
+                        st.success("Password changed - Please login again")
+                    else:
+                        st.error("Current password is wrong")
+    if st.button("Logout"):
+        logout()
+        st.rerun()
 
 def auth_section():
+    if check_login():
+        account_section()
+        return
+
     tab1, tab2 = st.tabs(["Login", "Register"])
-    
+
     with tab1:
         with st.form("Login"):
             email = st.text_input("Email")
             password = st.text_input("Password", type="password")
             if st.form_submit_button("Login"):
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("SELECT email FROM members WHERE email=? AND password=?", 
-                             (email, password))
-                result = cursor.fetchone()
-                conn.close()
-                if result:
-                    st.session_state.logged_in = True
-                    st.session_state.user_email = email
-                    st.rerun()
+                try:
+                    token = credentials.login(email, password, client=st.context.ip_address)
+                except credentials.LoginThrottled as e:
+                    st.error(str(e))
                 else:
-                    st.error("Invalid credentials - Try registering first")
+                    if token:
+                        st.session_state.session_token = token
+                        check_login()
+                        st.rerun()
+                    else:
+                        st.error("Invalid credentials - Try registering first")
 
     with tab2:
         with st.form("Register"):
             email = st.text_input("Email")
+            invite_code = st.text_input("Invite code", help="Ask an admin for the code for your email")
             password = st.text_input("Password", type="password")
             confirm_password = st.text_input("Confirm Password", type="password")
             if st.form_submit_button("Register"):
                 if password != confirm_password:
                     st.error("Passwords don't match")
                 else:
-                    conn = sqlite3.connect(DB_PATH)
                     try:
-                        # Insert with default empty values for other fields
-                        conn.execute("""INSERT INTO members 
-                                      (email, password, full_name, profession, expertise, can_help) 
-                                      VALUES (?,?,?,?,?,?)""", 
-                                    (email, password, "", "", "", ""))
-                        conn.commit()
-                        st.success("Registration successful! Please login")
-                    except sqlite3.IntegrityError:
-                        st.error("Email already registered - Try logging in instead")
-                    finally:
-                        conn.close()
+                        outcome = credentials.register(email, password, invite_code,
+                                                       client=st.context.ip_address)
+                    except credentials.LoginThrottled as e:
+                        st.error(str(e))
+                    else:
+                        if outcome == credentials.REGISTERED:
+                            st.success("Registration successful! Please login")
+                        elif outcome == credentials.ALREADY_REGISTERED:
+                            st.error("Email already registered - Try logging in instead")
+                        elif outcome == credentials.INVALID_INVITE:
+                            st.error("Invite code is wrong or has expired - Ask an admin for a new one")
+                        else:
+                            st.error("No member profile uses this email - Create your profile first")
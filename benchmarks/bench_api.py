@@ -0,0 +1,132 @@
+"""Requests per second against the read-only profile API.
+
+Starts api.app under uvicorn on a free local port and drives it with
+asyncio clients, each holding one keep-alive HTTP/1.1 connection. Cases:
+
+  profile 200      GET /profiles/{id} with no validator
+  profile 304      the same, sending back the ETag it was given
+  qr 304           GET /profiles/{id}/qr.png revalidation
+  pdf 304          GET /profiles/{id}/profile.pdf revalidation (no render)
+  search           GET /search?q=... first pages
+
+    python -m benchmarks.bench_api --members 10000 --requests 5000 --clients 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+
+import api
+import database
+import qr_generator
+from benchmarks import synthetic
+
+SEARCH_TERMS = ("engineer", "textile", "karachi", "export", "doctor", "dubai")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port,
+                                           log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def _request(reader, writer, path, etag=None):
+    headers = f"GET {path} HTTP/1.1\r\nHost: bench\r\n"
+    if etag:
+        headers += f"If-None-Match: {etag}\r\n"
+    writer.write((headers + "\r\n").encode())
+    status_line = await reader.readline()
+    length, got_etag = 0, None
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "etag":
+            got_etag = value.strip()
+    if length:
+        await reader.readexactly(length)
+    return int(status_line.split()[1]), got_etag
+
+
+async def _run(port, paths, clients, revalidate):
+    # paths: one list of request paths per client
+    etags = {}
+    if revalidate:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for path in {p for client in paths for p in client}:
+            etags[path] = (await _request(reader, writer, path))[1]
+        writer.close()
+
+    statuses = {}
+
+    async def client(mine):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for path in mine:
+            status, _ = await _request(reader, writer, path, etags.get(path))
+            statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(mine) for mine in paths))
+    elapsed = time.perf_counter() - start
+    return sum(len(mine) for mine in paths) / elapsed, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--hot", type=int, default=200, help="profiles that receive requests")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "api.db")
+        qr_generator.QR_CACHE_DIR = os.path.join(tmp, "qr")
+        database.init_db()
+        database.migrate_db()
+        synthetic.fill_db(args.members)
+        ids = [pid for (pid,) in database.get_connection().execute(
+            "SELECT id FROM members ORDER BY rowid LIMIT ?", (args.hot,))]
+        port = _free_port()
+        server = _start_server(port)
+
+        rng = random.Random(synthetic.SEED)
+        per_client = args.requests // args.clients
+
+        def spread(make):
+            return [[make() for _ in range(per_client)] for _ in range(args.clients)]
+
+        pdf_ids = ids[:20]  # bounds the warm-up renders
+        cases = (
+            ("profile 200", spread(lambda: f"/profiles/{rng.choice(ids)}"), False),
+            ("profile 304", spread(lambda: f"/profiles/{rng.choice(ids)}"), True),
+            ("qr 304", spread(lambda: f"/profiles/{rng.choice(ids)}/qr.png"), True),
+            ("pdf 304", spread(lambda: f"/profiles/{rng.choice(pdf_ids)}/profile.pdf"), True),
+            ("search", spread(lambda: f"/search?q={rng.choice(SEARCH_TERMS)}&limit=20"), False),
+        )
+        print(f"{args.members} members, {args.clients} keep-alive clients, "
+              f"{api.API_DB_THREADS} API threads")
+        for label, paths, revalidate in cases:
+            per_s, statuses = asyncio.run(_run(port, paths, args.clients, revalidate))
+            print(f"{label:>12}: {per_s:8.0f} req/s  statuses {dict(sorted(statuses.items()))}")
+        server.should_exit = True
+        database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
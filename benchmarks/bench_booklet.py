@@ -0,0 +1,71 @@
+"""Directory booklet throughput by worker count, and peak memory by size.
+
+Each run builds a booklet (or ZIP) in a fresh process with a cold QR
+cache and reports profiles/s, speedup over the first worker count, and
+the peak RSS of the main process and of the largest worker. Flat peaks
+across --sizes show memory does not grow with the member count.
+
+    python -m benchmarks.bench_booklet --sizes 500,2000 --workers 1,2,4
+    python -m benchmarks.bench_booklet --sizes 50000 --workers 8 --zip
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+
+import database
+from benchmarks import synthetic
+
+
+def _build(db_path, out, workers, as_zip, results):
+    import booklet
+    database.DB_PATH = db_path
+    build = booklet.build_zip if as_zip else booklet.build_booklet
+    report = build(out, workers=workers)
+    results.put((report, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+
+
+def run(db_path, out, workers, as_zip, qr_dir):
+    # In a child process so ru_maxrss is this run's peak alone
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    os.environ["KARWAN_QR_CACHE_DIR"] = qr_dir  # inherited by the pool's workers
+    child = context.Process(target=_build, args=(db_path, out, workers, as_zip, results))
+    child.start()
+    outcome = results.get()
+    child.join()
+    return outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="500,2000", help="member counts, comma-separated")
+    parser.add_argument("--workers", default="1,2,4", help="worker counts, comma-separated")
+    parser.add_argument("--zip", action="store_true", help="build ZIPs instead of booklets")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {'ZIP' if args.zip else 'booklet'}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            database.DB_PATH = os.path.join(tmp, f"booklet{size}.db")
+            database.migrate_db()
+            synthetic.fill_db(size)
+            database.close_all_connections()
+            first = None
+            for workers in (int(w) for w in args.workers.split(",")):
+                out = os.path.join(tmp, f"out{size}_{workers}.{'zip' if args.zip else 'pdf'}")
+                report, main_kb, worker_kb = run(database.DB_PATH, out, workers, args.zip,
+                                                 os.path.join(tmp, f"qr{size}_{workers}"))
+                per_s = report.profiles / report.seconds
+                first = first or per_s
+                print(f"{size:>7} members, {workers:>2} workers: {per_s:7.1f} profiles/s "
+                      f"(x{per_s / first:.2f})  {report.pages} pages, "
+                      f"{os.path.getsize(out) / 2 ** 20:.1f} MiB  "
+                      f"peak RSS main {main_kb / 1024:.0f} MiB, worker {worker_kb / 1024:.0f} MiB")
+                os.remove(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Throughput of bulk_import for a generated member file.
+
+Runs a full import (all inserts) and then re-imports the same file (all
+updates by email). About 1% of rows are deliberately invalid.
+
+    python -m benchmarks.bench_bulk_import --rows 100000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+
+import bulk_import
+import database
+
+CITIES = [("Lahore", "Pakistan"), ("Karachi", "Pakistan"), ("Islamabad", "Pakistan"),
+          ("Dubai", "United Arab Emirates"), ("London", "United Kingdom"),
+          ("Riyadh", "Saudi Arabia"), ("Toronto", "Canada")]
+
+
+def write_member_file(path, rows, seed=1):
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(bulk_import.IMPORT_COLUMNS)
+        for i in range(rows):
+            city, country = rng.choice(CITIES)
+            email = f"member{i}@example.com" if rng.random() > 0.01 else f"member{i}-at-example"
+            # REQUIRED_COLUMNS then OPTIONAL_COLUMNS
+            writer.writerow([f"Member {i}", email, city, country, f"0300{rng.randrange(10 ** 7):07d}",
+                             "Engineer", "Supply chain", "Introductions", "", "", ""])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-rows", type=int, default=bulk_import.BATCH_ROWS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "members.csv")
+        write_member_file(path, args.rows)
+        database.DB_PATH = os.path.join(tmp, "import.db")
+        database.init_db()
+        database.migrate_db()
+        for label in ("insert", "upsert"):
+            report = bulk_import.import_members(path, batch_rows=args.batch_rows)
+            print(f"{label:>6}: {args.rows} rows in {report.seconds:6.2f} s "
+                  f"({args.rows / report.seconds:8.0f} rows/s) - {report.inserted} new, "
+                  f"{report.updated} updated, {report.failed} rejected")
+        database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
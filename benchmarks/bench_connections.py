@@ -0,0 +1,125 @@
+"""Reads/sec and writes/sec with pooled vs. per-call SQLite connections.
+
+Each worker stands in for one Streamlit session. Like Streamlit, it runs
+every rerun on a new thread, which makes a few profile lookups and saves,
+the same calls a rerun of app.py makes.
+
+    python -m benchmarks.bench_connections --sessions 8 --seconds 5 --calls-per-rerun 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+
+
+def _profile(i):
+    return {
+        'id': f"{i}-BM-010125",
+        'full_name': f"Bench Member {i}",
+        'email': f"member{i}@example.com",
+        'city': "Lahore",
+        'country': "Pakistan",
+        'primary_phone': "+92 300 0000000",
+        'secondary_phone': '',
+        'profession': "Engineer",
+        'expertise': "Benchmarking",
+        'how_to_help': "Mentoring",
+        'help_needed': "Funding",
+        'business_url': '',
+    }
+
+
+def _unpooled_get_profile_by_id(profile_id):
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM members WHERE id=?", (profile_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def _unpooled_save_profile(profile_data):
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute(database.UPSERT_PROFILE, tuple(profile_data[k] for k in (
+        'id', 'full_name', 'email', 'city', 'country', 'primary_phone',
+        'secondary_phone', 'profession', 'expertise', 'how_to_help',
+        'help_needed', 'business_url')))
+    conn.commit()
+    conn.close()
+    return True
+
+
+def run(read, write, sessions, seconds, rows, write_ratio, calls_per_rerun):
+    counts = {'reads': 0, 'writes': 0, 'errors': 0, 'reruns': 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def rerun(rng, tally):
+        for _ in range(calls_per_rerun):
+            i = rng.randrange(rows)
+            try:
+                if rng.random() < write_ratio:
+                    write(_profile(i))
+                    tally['writes'] += 1
+                else:
+                    read(f"{i}-BM-010125")
+                    tally['reads'] += 1
+            except sqlite3.OperationalError:
+                tally['errors'] += 1
+
+    def session(seed):
+        rng = random.Random(seed)
+        tally = {'reads': 0, 'writes': 0, 'errors': 0, 'reruns': 0}
+        while time.perf_counter() < stop:
+            thread = threading.Thread(target=rerun, args=(rng, tally))
+            thread.start()
+            thread.join()
+            tally['reruns'] += 1
+        with lock:
+            for k, v in tally.items():
+                counts[k] += v
+
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {k: v / seconds if k != 'errors' else v for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--calls-per-rerun", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        database.migrate_db()
+        for i in range(args.rows):
+            database.save_profile(_profile(i))
+
+        for label, read, write in (
+            ("per-call connect", _unpooled_get_profile_by_id, _unpooled_save_profile),
+            ("pooled + WAL", database.get_profile_by_id, database.save_profile),
+        ):
+            result = run(read, write, args.sessions, args.seconds, args.rows,
+                         args.write_ratio, args.calls_per_rerun)
+            print(f"{label:>18}: {result['reads']:>10.0f} reads/s "
+                  f"{result['writes']:>8.0f} writes/s {result['reruns']:>8.0f} reruns/s  "
+                  f"({result['errors']} lock errors)")
+        opened = len(database._held) + sum(len(idle) for idle in database._idle.values())
+        print(f"{'':>18}  {opened} pooled connections open")
+        database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
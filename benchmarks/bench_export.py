@@ -0,0 +1,70 @@
+"""Time and peak Python memory of the streaming export at several table sizes.
+
+Streaming means per-row time and peak memory of export_profiles should
+stay roughly flat as the table grows. That covers building the file only:
+st.download_button then reads the whole file into memory to serve it, so
+the admin UI path still grows with the table. The old path (DataFrame ->
+CSV string -> base64) is timed alongside it for comparison.
+
+    python -m benchmarks.bench_export --sizes 10000 100000 1000000
+"""
+import argparse
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+
+import database
+
+
+def _fill(rows):
+    with database.transaction() as conn:
+        conn.executemany(database.INSERT_PROFILE, (
+            (f"{i}-BM-010125", f"Member {i}", f"member{i}@example.com", "Lahore", "Pakistan",
+             "+92 300 0000000", "", "Engineer", "Export benchmarking " * 5,
+             "Mentoring and introductions", "Funding", "https://example.com")
+            for i in range(rows)))
+
+
+def _measure(fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def _legacy_csv():
+    csv = database.get_all_profiles().to_csv(index=False)
+    base64.b64encode(csv.encode()).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "export.db")
+            database.init_db()
+            database.migrate_db()
+            _fill(size)
+            cases = [(fmt, lambda fmt=fmt: database.export_profiles(fmt).close())
+                     for fmt in database.EXPORT_FORMATS]
+            if not args.skip_legacy:
+                cases.append(("legacy csv+base64", _legacy_csv))
+            for label, fn in cases:
+                elapsed, peak = _measure(fn)
+                print(f"{size:>9} rows {label:>18}: {elapsed:7.2f} s "
+                      f"{elapsed / size * 1e6:6.2f} us/row  peak {peak / 1024:10.0f} KiB")
+            database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
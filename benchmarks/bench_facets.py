@@ -0,0 +1,84 @@
+"""Facet count cost: the trigger-maintained table against COUNT(*) and pandas.
+
+Also times member writes with the facet triggers in place, as worker
+threads insert, move (country, city, profession) and delete members
+through save_profile and the bulk upsert. tests/test_facets.py checks
+the counts themselves.
+
+    python -m benchmarks.bench_facets --members 20000 --threads 8 --ops 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import database
+from benchmarks import synthetic
+
+
+def _writer(seed, ops, ids, new_members):
+    rng = random.Random(seed)
+    for i in range(ops):
+        action = rng.random()
+        if action < 0.4:
+            profile = dict(database.get_profile_by_id(rng.choice(ids)) or {})
+            if profile:
+                other = next(synthetic.synthetic_members(1, seed * 100000 + i))
+                profile.update(country=other['country'], city=other['city'], profession=other['profession'])
+                database.save_profile(profile)
+        elif action < 0.7:
+            database.save_profile(dict(next(new_members), id=None))
+        elif action < 0.85:
+            batch = [dict(next(new_members), id=None) for _ in range(5)]
+            database.upsert_profiles_by_email(batch)
+        else:
+            with database.transaction() as conn:
+                conn.execute("DELETE FROM members WHERE id = ?", (rng.choice(ids),))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=500, help="writes per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "facets.db")
+        database.init_db()
+        database.migrate_db()
+        synthetic.fill_db(args.members)
+        ids = [pid for (pid,) in database.get_connection().execute("SELECT id FROM members")]
+
+        threads = []
+        for t in range(args.threads):
+            new_members = (dict(m, email=f"t{t}.{m['email']}")
+                           for m in synthetic.synthetic_members(args.ops * 5, seed=1000 + t, start=10**7))
+            threads.append(threading.Thread(target=_writer, args=(t, args.ops, ids, new_members)))
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writes_s = time.perf_counter() - start
+
+        country = database.facet_counts("country", limit=1)[0][0]
+        timings = {}
+        for label, fn in (("facet table", lambda: database.count_profiles("", {"country": country})),
+                          ("COUNT(*)", lambda: database.get_connection().execute(
+                              "SELECT COUNT(*) FROM members WHERE country = ?", (country,)).fetchone()),
+                          ("pandas", lambda: database.get_all_profiles().groupby("country").size())):
+            start = time.perf_counter()
+            for _ in range(20):
+                fn()
+            timings[label] = (time.perf_counter() - start) / 20
+        database.close_all_connections()
+
+    print(f"{args.threads * args.ops} writes in {writes_s:.1f} s")
+    print("count by country: " + ", ".join(f"{k} {v * 1000:.3f} ms" for k, v in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Logins per second at the configured scrypt cost, and session checks per second.
+
+Script threads stand in for Streamlit sessions logging in at once; every
+login runs one scrypt on the credentials hash pool. Then the same sessions
+re-check their tokens as every rerun would (check_token): once each with
+a cold token cache (a credentials lookup per token), then repeatedly.
+Finally a brute-force burst against one account shows where the rate
+limiter cuts in.
+
+    python -m benchmarks.bench_logins --accounts 200 --sessions 16
+    KARWAN_SCRYPT_N=32768 KARWAN_HASH_WORKERS=4 python -m benchmarks.bench_logins
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import credentials
+import database
+from benchmarks import synthetic
+
+
+def _parallel(fn, items, sessions):
+    chunks = [items[i::sessions] for i in range(sessions)]
+    results = []
+    lock = threading.Lock()
+
+    def session(chunk):
+        mine = [fn(item) for item in chunk]
+        with lock:
+            results.extend(mine)
+
+    threads = [threading.Thread(target=session, args=(c,)) for c in chunks]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--checks", type=int, default=50, help="token checks per account")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "logins.db")
+        database.migrate_db()
+        synthetic.fill_db(args.accounts)  # logins attach to existing members
+        emails = [r[0] for r in database.get_connection().execute("SELECT email FROM members")]
+        start = time.perf_counter()
+        for email in emails:
+            assert credentials.register(email, "correct horse " + email,
+                                        credentials.create_invite(email)) == credentials.REGISTERED
+        print(f"scrypt N={credentials.SCRYPT_N} r={credentials.SCRYPT_R} p={credentials.SCRYPT_P}, "
+              f"{credentials.HASH_WORKERS} hash workers, {args.sessions} sessions; "
+              f"{args.accounts} registrations took {time.perf_counter() - start:.1f} s")
+
+        tokens, elapsed = _parallel(lambda e: credentials.login(e, "correct horse " + e),
+                                    emails, args.sessions)
+        assert all(tokens)
+        print(f"{'login':>18}: {len(tokens) / elapsed:9.1f} /s")
+
+        credentials._tokens.clear()
+        for label, checks in (("token check cold", tokens), ("token check warm", tokens * args.checks)):
+            results, elapsed = _parallel(credentials.check_token, checks, args.sessions)
+            assert all(results)
+            print(f"{label:>18}: {len(checks) / elapsed:9.0f} /s")
+
+        outcomes = {"wrong": 0, "throttled": 0}
+        start = time.perf_counter()
+        for attempt in range(50):
+            try:
+                credentials.login(emails[0], f"guess {attempt}", client="203.0.113.7")
+                outcomes["wrong"] += 1
+            except credentials.LoginThrottled:
+                outcomes["throttled"] += 1
+        print(f"{'brute-force burst':>18}: 50 guesses in {time.perf_counter() - start:.2f} s, "
+              f"{outcomes['wrong']} hashed, {outcomes['throttled']} throttled")
+        database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Build time, query latency and incremental update cost of the match index.
+
+    python -m benchmarks.bench_matching --members 100000 --queries 500
+"""
+import argparse
+import random
+import statistics
+import time
+
+import matching
+from benchmarks.synthetic import SKILLS
+
+LOCATIONS = [("Lahore", "Pakistan"), ("Karachi", "Pakistan"), ("Islamabad", "Pakistan"),
+             ("Faisalabad", "Pakistan"), ("Dubai", "United Arab Emirates"),
+             ("London", "United Kingdom"), ("Riyadh", "Saudi Arabia"), ("Toronto", "Canada"),
+             ("Houston", "United States"), ("Kuala Lumpur", "Malaysia")]
+
+
+def synthetic_profiles(n, seed=7):
+    rng = random.Random(seed)
+    for i in range(n):
+        city, country = rng.choice(LOCATIONS)
+        yield {
+            'id': f"{i + 1}-BM-010125", 'city': city, 'country': country,
+            'how_to_help': " ".join(rng.sample(SKILLS, 6)),
+            'expertise': " ".join(rng.sample(SKILLS, 4)),
+            'help_needed': " ".join(rng.sample(SKILLS, 3)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = matching.MatchIndex(synthetic_profiles(args.members))
+    print(f"build: {time.perf_counter() - start:.2f} s for {args.members} members, "
+          f"{len(index.vocab)} terms, {index.matrix.nnz} non-zeros")
+
+    queries = list(synthetic_profiles(args.queries, seed=11))
+    for label, kwargs in (("unfiltered", {}), ("country filter", {"country": "Pakistan"}),
+                          ("city filter", {"city": "Dubai"})):
+        latencies = []
+        for q in queries:
+            start = time.perf_counter()
+            index.query(q['help_needed'], k=args.k, exclude=q['id'], **kwargs)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"query {label:>14}: p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f} ms")
+
+    updates = list(synthetic_profiles(1000, seed=13))
+    start = time.perf_counter()
+    for p in updates:
+        index.update(p)
+    print(f"incremental update: {(time.perf_counter() - start) / len(updates) * 1e6:.1f} us/profile")
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        index.query(q['help_needed'], k=args.k, exclude=q['id'])
+        latencies.append(time.perf_counter() - start)
+    print(f"query with {len(index.overrides)} pending updates: p50 "
+          f"{statistics.median(latencies) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Overhead of the instrumentation layer on a fast database call.
+
+Times get_profile_by_id unwrapped, instrumented but disabled, and enabled.
+Disabled should be within noise of unwrapped.
+
+    python -m benchmarks.bench_metrics --calls 50000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import database
+import metrics
+from benchmarks import synthetic
+
+
+def _per_call_us(fn, arg, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn(arg)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50000)
+    parser.add_argument("--members", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "metrics.db")
+        database.init_db()
+        database.migrate_db()
+        synthetic.fill_db(args.members)
+        pid = database.get_connection().execute("SELECT id FROM members LIMIT 1").fetchone()[0]
+
+        raw = database.get_profile_by_id.__wrapped__
+        metrics.enable(False)
+        _per_call_us(database.get_profile_by_id, pid, 1000)  # warm up
+        cases = [("unwrapped", raw), ("disabled", database.get_profile_by_id)]
+        results = {label: _per_call_us(fn, pid, args.calls) for label, fn in cases}
+        metrics.enable()
+        results["enabled"] = _per_call_us(database.get_profile_by_id, pid, args.calls)
+        metrics.enable(False)
+        database.close_all_connections()
+
+    for label, us in results.items():
+        print(f"{label:>10}: {us:7.2f} us/call  ({us - results['unwrapped']:+.2f} us)")
+
+
+if __name__ == "__main__":
+    main()
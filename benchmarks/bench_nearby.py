@@ -0,0 +1,92 @@
+"""Radius and k-nearest queries on the grid index against a naive full scan.
+
+Members are placed at gazetteer cities, as the app stores them; --jitter
+spreads them around their city to show the worst case where every member
+has a distinct point. Grid results are checked against the scan.
+
+    python -m benchmarks.bench_nearby --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+
+import gazetteer
+import nearby
+
+
+def synthetic_points(n, jitter_deg=0.0, seed=7):
+    places = gazetteer._index()[0]
+    rng = random.Random(seed)
+    for i in range(n):
+        p = rng.choice(places)
+        lat, lon = p.lat, p.lon
+        if jitter_deg:
+            lat = max(-90.0, min(90.0, lat + rng.uniform(-jitter_deg, jitter_deg)))
+            lon = lon + rng.uniform(-jitter_deg, jitter_deg)
+        yield f"{i + 1}-BM-010125", lat, lon
+
+
+def naive_within(points, lat, lon, radius_km):
+    found = [nearby.Neighbour(pid, d) for pid, plat, plon in points
+             if (d := nearby.haversine_km(lat, lon, plat, plon)) <= radius_km]
+    found.sort(key=lambda n: (n.distance_km, n.profile_id))
+    return found
+
+
+def naive_nearest(points, lat, lon, k):
+    found = [nearby.Neighbour(pid, nearby.haversine_km(lat, lon, plat, plon)) for pid, plat, plon in points]
+    found.sort(key=lambda n: (n.distance_km, n.profile_id))
+    return found[:k]
+
+
+def _time(fn, queries):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(*q))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--naive-queries", type=int, default=10,
+                        help="the full scan is slow at 1M; it is timed on the first N queries")
+    parser.add_argument("--radius", type=float, default=100.0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--jitter", type=float, default=0.0, help="degrees")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    places = gazetteer._index()[0]
+    centres = [(p.lat, p.lon) for p in rng.choices(places, k=args.queries)]
+
+    for size in args.sizes:
+        points = list(synthetic_points(size, args.jitter))
+        start = time.perf_counter()
+        index = nearby.SpatialIndex()
+        for pid, lat, lon in points:
+            index.add(pid, lat, lon)
+        print(f"{size:>9} members: index built in {time.perf_counter() - start:.2f} s, "
+              f"{len(index.points)} distinct points in {len(index.cells)} cells")
+
+        cases = (("radius", args.radius, index.within, naive_within),
+                 ("knn", args.k, index.nearest, naive_nearest))
+        for label, arg, fast, slow in cases:
+            grid, g50, g99 = _time(fast, [(lat, lon, arg) for lat, lon in centres])
+            scan, s50, s99 = _time(lambda *q: slow(points, *q),
+                                   [(lat, lon, arg) for lat, lon in centres[:args.naive_queries]])
+            # Distances must agree; ids can legitimately differ between equal-distance ties
+            same = all([round(n.distance_km, 6) for n in a] == [round(n.distance_km, 6) for n in b]
+                       for a, b in zip(grid, scan))
+            print(f"{'':>9} {label:>6}: grid p50 {g50 * 1000:8.3f} ms p99 {g99 * 1000:8.3f} ms | "
+                  f"scan p50 {s50 * 1000:9.1f} ms p99 {s99 * 1000:9.1f} ms | "
+                  f"{s50 / g50:7.0f}x {'match' if same else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
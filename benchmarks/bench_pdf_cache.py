@@ -0,0 +1,54 @@
+"""Profile PDF render time, cold against a cache hit.
+
+    python -m benchmarks.bench_pdf_cache --repeat 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import database
+import pdf_generator
+import qr_generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "pdf.db")
+        qr_generator.QR_CACHE_DIR = os.path.join(tmp, "qr")
+        database.init_db()
+        database.migrate_db()
+
+        profile = {
+            'full_name': "Ayesha Siddiqui", 'email': "ayesha@example.com",
+            'city': "Karachi", 'country': "Pakistan", 'primary_phone': "+92 300 1234567",
+            'secondary_phone': '', 'profession': "Textile Exporter",
+            'expertise': "Cotton yarn sourcing and export compliance " * 4,
+            'how_to_help': "Introductions to mills in Faisalabad",
+            'help_needed': "Buyers in the EU", 'business_url': "https://example.com",
+        }
+        database.save_profile(profile)
+        qr = qr_generator.generate_qr_code(f"https://karwan-e-tijarat.streamlit.app/?profile_id={profile['id']}", "H")
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            pdf_generator.generate_profile_pdf(profile, qr)
+        render_s = (time.perf_counter() - start) / args.repeat
+
+        pdf_generator.get_profile_pdf(profile, qr)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            pdf_generator.get_profile_pdf(dict(database.get_profile_by_id(profile['id'])), qr)
+        hit_s = (time.perf_counter() - start) / args.repeat
+
+        database.close_all_connections()
+
+    print(f"fresh render {render_s * 1000:.2f} ms, cache hit {hit_s * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Burst of QR-scan profile views, with and without the snapshot cache.
+
+Worker threads stand in for Streamlit sessions opening ?profile_id= pages.
+Views follow a Zipf-like popularity curve (a few speakers get most scans)
+while a trickle of saves keeps invalidating the cache. The uncached path is
+what the page did before: get_profile_by_id plus a fresh QR encode. It is
+slow, so it runs for fewer views (--uncached-views).
+
+    python -m benchmarks.bench_profile_views --members 10000 --views 20000 --sessions 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import database
+import profile_cache
+import qr_generator
+from benchmarks import synthetic
+
+
+def _uncached_view(profile_id):
+    profile = database.get_profile_by_id(profile_id)
+    if profile:
+        qr_generator._render(profile_cache.PROFILE_URL.format(profile_id), "H", 10, 4)
+    return profile
+
+
+def run(view, ids, weights, views, sessions, write_every):
+    latencies = []
+    lock = threading.Lock()
+    per_session = views // sessions
+
+    def session(seed):
+        rng = random.Random(seed)
+        picks = rng.choices(ids, weights, k=per_session)
+        mine = []
+        for i, pid in enumerate(picks):
+            if write_every and i % write_every == write_every - 1:
+                profile = dict(database.get_profile_by_id(rng.choice(ids)))
+                profile['expertise'] += "."
+                database.save_profile(profile)
+            start = time.perf_counter()
+            view(pid)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=10000)
+    parser.add_argument("--views", type=int, default=20000)
+    parser.add_argument("--uncached-views", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--hot", type=int, default=200, help="profiles that receive scans")
+    parser.add_argument("--write-every", type=int, default=200,
+                        help="each session saves a profile every N views (0: no writes)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "views.db")
+        qr_generator.QR_CACHE_DIR = os.path.join(tmp, "qr")
+        database.init_db()
+        database.migrate_db()
+        synthetic.fill_db(args.members)
+        ids = [pid for (pid,) in database.get_connection().execute(
+            "SELECT id FROM members ORDER BY rowid LIMIT ?", (args.hot,))]
+        weights = [1 / (rank + 1) for rank in range(len(ids))]
+
+        cases = (("uncached", _uncached_view, args.uncached_views),
+                 ("snapshot cache", profile_cache.get_profile_view, args.views))
+        for label, view, views in cases:
+            profile_cache.clear_cache()
+            per_s, p50, p99 = run(view, ids, weights, views, args.sessions, args.write_every)
+            line = (f"{label:>15}: {per_s:8.0f} views/s  p50 {p50 * 1000:7.3f} ms  p99 {p99 * 1000:7.3f} ms")
+            if view is profile_cache.get_profile_view:
+                stats = profile_cache.cache_stats()
+                line += (f"  hit ratio {stats['hit_rate']:.1%} "
+                         f"({stats['stale']} re-read after writes, {stats['misses']} cold)")
+            print(line)
+        database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
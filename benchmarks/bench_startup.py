@@ -0,0 +1,61 @@
+"""Time-to-first-render and import cost of app.py.
+
+Each sample runs in a fresh interpreter: the first AppTest run of app.py is
+the cold start a new server process pays, the second is a warm rerun.
+Also reports which heavy libraries were loaded by the first render.
+
+    python -m benchmarks.bench_startup --samples 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "reportlab", "qrcode", "geopy", "phonenumbers", "pycountry", "PIL")
+
+_SAMPLE = r"""
+import json, os, sys, time
+from streamlit.testing.v1 import AppTest
+os.chdir(sys.argv[2])
+sys.path.insert(0, sys.argv[1])
+at = AppTest.from_file(os.path.join(sys.argv[1], "app.py"), default_timeout=120)
+at.secrets["ADMIN_PASSWORD"] = ""
+t0 = time.perf_counter()
+at.run()
+t1 = time.perf_counter()
+at.run()
+t2 = time.perf_counter()
+print(json.dumps({"first_render": t1 - t0, "rerun": t2 - t1,
+                  "loaded": sorted(m for m in sys.argv[3].split(",") if m in sys.modules),
+                  "errors": [str(e.value) for e in at.exception]}))
+"""
+
+
+def sample(workdir):
+    out = subprocess.run([sys.executable, "-c", _SAMPLE, ROOT, workdir, ",".join(HEAVY_MODULES)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        samples = [sample(workdir) for _ in range(args.samples)]
+    result = {
+        "first_render_median_s": statistics.median(s["first_render"] for s in samples),
+        "rerun_median_s": statistics.median(s["rerun"] for s in samples),
+        "heavy_modules_loaded": samples[-1]["loaded"],
+        "errors": samples[-1]["errors"],
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
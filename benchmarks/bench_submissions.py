@@ -0,0 +1,120 @@
+"""Profile submissions per second with and without the post-save pipeline.
+
+A fixed pool of threads stands in for Streamlit script threads, each
+taking one submission at a time from a queue, as a sign-up rush would
+arrive. Three ways of handling a submission are compared:
+
+  inline+sleep  save, render QR and PDF, then time.sleep(3) (the old page)
+  inline        the same without the sleep
+  pipeline      save and hand rendering to jobs; the page returns at once
+
+"response" is how long a submitter's page is busy; "ready" is when their
+PDF exists.
+
+    python -m benchmarks.bench_submissions --submissions 300 --script-threads 16
+"""
+import argparse
+import os
+import queue
+import statistics
+import tempfile
+import threading
+import time
+
+import database
+import jobs
+import qr_generator
+import pdf_generator
+from benchmarks import synthetic
+
+PROFILE_URL = "https://karwan-e-tijarat.streamlit.app/?profile_id={}"
+OLD_SLEEP_S = 3.0
+
+
+def _inline(profile, sleep_s):
+    database.save_profile(profile)
+    url = PROFILE_URL.format(profile['id'])
+    qr = qr_generator.generate_qr_code(url, error_correction="H")
+    pdf_generator.get_profile_pdf(profile, qr)
+    ready = time.perf_counter()
+    time.sleep(sleep_s)
+    return lambda: ready
+
+
+def _pipeline(profile):
+    database.save_profile(profile)
+    job_id = jobs.submit_profile_assets(profile, PROFILE_URL.format(profile['id']))
+
+    def ready():
+        while jobs.status(job_id).state in ("queued", "running"):
+            time.sleep(0.005)
+        return time.perf_counter()
+    return ready
+
+
+def run(handle, profiles, script_threads):
+    work = queue.Queue()
+    for p in profiles:
+        work.put(p)
+    responses, waiters = [], []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def script_thread():
+        while True:
+            try:
+                profile = work.get_nowait()
+            except queue.Empty:
+                return
+            t0 = time.perf_counter()
+            ready = handle(profile)
+            with lock:
+                responses.append(time.perf_counter() - t0)
+                waiters.append(ready)
+
+    threads = [threading.Thread(target=script_thread) for _ in range(script_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    accepted = time.perf_counter() - start
+    all_ready = max(w() for w in waiters) - start
+    responses.sort()
+    return {
+        'per_s': len(profiles) / accepted,
+        'response_p50': statistics.median(responses),
+        'response_p99': responses[int(len(responses) * 0.99)],
+        'all_ready_s': all_ready,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=300)
+    parser.add_argument("--script-threads", type=int, default=16)
+    parser.add_argument("--skip-sleep", action="store_true", help="leave out the inline+sleep case")
+    args = parser.parse_args()
+
+    modes = [("inline", lambda p: _inline(p, 0.0)), ("pipeline", _pipeline)]
+    if not args.skip_sleep:
+        modes.insert(0, ("inline+sleep", lambda p: _inline(p, OLD_SLEEP_S)))
+
+    print(f"{args.submissions} submissions over {args.script_threads} script threads, "
+          f"{jobs.JOB_WORKERS} render workers")
+    for seed, (label, handle) in enumerate(modes):
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "submissions.db")
+            qr_generator.QR_CACHE_DIR = os.path.join(tmp, "qr")
+            database.init_db()
+            database.migrate_db()
+            profiles = list(synthetic.synthetic_members(args.submissions, seed=seed + 100))
+            for p in profiles:
+                p['id'] = None
+            r = run(handle, profiles, args.script_threads)
+            print(f"{label:>13}: {r['per_s']:7.1f} submissions/s  response p50 {r['response_p50'] * 1000:7.1f} ms "
+                  f"p99 {r['response_p99'] * 1000:7.1f} ms  all PDFs ready after {r['all_ready_s']:.1f} s")
+            database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
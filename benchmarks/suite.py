@@ -0,0 +1,188 @@
+"""Time the app's hot paths at several table sizes and emit JSON.
+
+Each size gets a fresh database filled by benchmarks.synthetic, so runs on
+different commits see identical data. Compare against an earlier run's JSON
+to flag regressions; the exit status is 1 if any are found.
+
+    python -m benchmarks.suite --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.suite --baseline bench.json --threshold 0.25
+
+app.generate_pdf and app.generate_qr_code are thin Streamlit wrappers, so
+the modules behind them are timed directly: the PDF renderer and its
+cache, and the QR encoder cold (new URL) and warm (cached).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import database
+import emails
+import pdf_generator
+import qr_generator
+from benchmarks import synthetic
+
+# A slower p50 only counts as a regression if it is also this much slower in
+# absolute terms; sub-0.05 ms operations are mostly timer noise.
+NOISE_FLOOR_MS = 0.05
+PROFILE_URL = "https://karwan-e-tijarat.streamlit.app/?profile_id={}"
+
+
+def _time(fn, args, budget_s):
+    # Runs fn over args until they run out or the time budget is spent; the
+    # first few calls are a warm-up. Each argument is used once, so inserts
+    # and cold-cache calls really are new. Returns latencies in milliseconds.
+    for a in args[:3]:
+        fn(a)
+    latencies = []
+    deadline = time.perf_counter() + budget_s
+    for a in args[3:]:
+        start = time.perf_counter()
+        fn(a)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if time.perf_counter() > deadline and len(latencies) >= 5:
+            break
+    latencies.sort()
+    return {
+        'n': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies), 4),
+        'p50_ms': round(latencies[len(latencies) // 2], 4),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)], 4),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)], 4),
+    }
+
+
+def _operations(size, repeat, seed):
+    # (name, fn, argument list) for one filled database of `size` members
+    rng = random.Random(seed)
+    ids = [pid for (pid,) in database.get_connection().execute("SELECT id FROM members ORDER BY rowid")]
+    sample = [dict(database.get_profile_by_id(pid)) for pid in rng.sample(ids, min(repeat, len(ids)))]
+    terms = [rng.choice([p['city'], p['profession'].split()[0], p['full_name'].split()[1],
+                         p['how_to_help'].split()[-1]]) for p in sample]
+    new_members = list(synthetic.synthetic_members(repeat, seed + 1, start=size + 1))
+    for m in new_members:
+        m['id'] = None
+        m['email'] = "new." + m['email']
+    updates = [dict(p, profession=p['profession'] + " (updated)") for p in sample]
+    qr = qr_generator.generate_qr_code(PROFILE_URL.format(sample[0]['id']), "H")
+
+    def save_new(profile):
+        database.save_profile(dict(profile))
+
+    return [
+        ("get_profile_by_id", database.get_profile_by_id, [p['id'] for p in sample]),
+        ("get_profile_by_email", database.get_profile_by_email, [p['email'] for p in sample]),
+        ("email_exists (unknown)", lambda e: (emails.begin_run(), emails.email_exists("x" + e)),
+         [p['email'] for p in sample]),
+        ("search_profiles", database.search_profiles, terms),
+        ("search_profiles_page", lambda t: database.search_profiles_page(t, page_size=12), terms),
+        ("save_profile (insert)", save_new, new_members),
+        ("save_profile (update)", database.save_profile, updates),
+        ("generate_custom_profile_id", database.generate_custom_profile_id,
+         [p['full_name'] for p in sample]),
+        ("generate_pdf (render)", lambda p: pdf_generator.generate_profile_pdf(p, qr), sample),
+        ("generate_pdf (cached)", lambda p: pdf_generator.get_profile_pdf(sample[0], qr), sample),
+        ("generate_qr_code (cold)", lambda p: qr_generator.generate_qr_code(
+            PROFILE_URL.format(p['id'] + "-cold"), "H"), sample),
+        ("generate_qr_code (warm)", lambda p: qr_generator.generate_qr_code(
+            PROFILE_URL.format(sample[0]['id']), "H"), sample),
+    ]
+
+
+def run(sizes, repeat, seed, budget_s):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "bench.db")
+            qr_generator.QR_CACHE_DIR = os.path.join(tmp, "qr")
+            qr_generator.clear_cache()
+            database.init_db()
+            database.migrate_db()
+            start = time.perf_counter()
+            synthetic.fill_db(size, seed)
+            print(f"{size:>9} members filled in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+            for name, fn, args in _operations(size, repeat, seed):
+                stats = _time(fn, args, budget_s)
+                results.append({'size': size, 'op': name, **stats})
+                print(f"{size:>9} {name:<28} p50 {stats['p50_ms']:9.3f} ms  "
+                      f"p95 {stats['p95_ms']:9.3f} ms  (n={stats['n']})", file=sys.stderr)
+            database.close_all_connections()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Returns (op, size, old p50, new p50) for every op that got slower by
+    # more than `threshold` (a fraction) and NOISE_FLOOR_MS.
+    old = {(r['size'], r['op']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        before = old.get((r['size'], r['op']))
+        if before is None:
+            continue
+        slower = r['p50_ms'] - before['p50_ms']
+        if slower > NOISE_FLOOR_MS and r['p50_ms'] > before['p50_ms'] * (1 + threshold):
+            regressions.append((r['op'], r['size'], before['p50_ms'], r['p50_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=200, help="calls per operation")
+    parser.add_argument("--budget", type=float, default=5.0,
+                        help="seconds per operation before stopping early")
+    parser.add_argument("--seed", type=int, default=synthetic.SEED)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fractional p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'started': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': run(args.sizes, args.repeat, args.seed, args.budget),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report['results'], json.load(f), args.threshold)
+        for op, size, before, after in regressions:
+            print(f"REGRESSION {op} @ {size}: p50 {before:.3f} ms -> {after:.3f} ms "
+                  f"(+{(after / before - 1) * 100:.0f}%)", file=sys.stderr)
+        print(f"{len(regressions)} regression(s) against {args.baseline}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
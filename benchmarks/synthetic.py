@@ -0,0 +1,120 @@
+"""Deterministic synthetic members for benchmarks.
+
+The same seed always yields the same members, IDs and timestamps, so two
+benchmark runs on different commits see identical data. Members are spread
+over the gazetteer's countries and cities, weighted towards Pakistan and
+the Gulf the way the real directory is.
+
+    python -m benchmarks.synthetic --members 50000 --db karwan_tijarat.db
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import database
+import gazetteer
+import reference_data
+
+SEED = 2024
+EPOCH = datetime(2024, 1, 1)
+FILL_CHUNK_ROWS = 10000
+
+FIRST_NAMES = """Muhammad Ahmed Ali Hassan Hussain Usman Bilal Hamza Omar Faisal Imran Kamran
+Zain Saad Asad Tariq Junaid Adeel Fahad Shahid Ayesha Fatima Zainab Maryam Sana Hira
+Amna Khadija Mehwish Nida Saba Rabia Iqra Sadia Farah Noor Sara Aliya Bushra Hina""".split()
+LAST_NAMES = """Khan Ahmed Ali Malik Sheikh Qureshi Siddiqui Chaudhry Butt Raza Hussain Shah
+Mirza Baig Javed Iqbal Akhtar Aslam Rana Abbasi Hashmi Gillani Bhatti Awan Rehman
+Farooq Saleem Nawaz Anwar Mahmood Zaidi Rizvi Naqvi Jafri Kazmi Memon Baloch""".split()
+PROFESSIONS = """Software Engineer|Textile Exporter|Chartered Accountant|Doctor|Civil Engineer
+|Architect|Lawyer|Marketing Consultant|Restaurant Owner|Real Estate Agent|Pharmacist
+|Logistics Manager|Data Scientist|Teacher|Investment Banker|Import/Export Trader
+|Graphic Designer|HR Consultant|Electrical Engineer|Agricultural Consultant
+|Startup Founder|Supply Chain Analyst|Journalist|Dentist|Travel Agent""".replace("\n", "").split("|")
+SKILLS = """export import logistics shipping customs textiles garments cotton leather
+surgical instruments sports goods rice mangoes citrus dates halal certification
+software development web mobile apps cloud devops cybersecurity data analytics
+machine learning accounting tax audit bookkeeping legal contracts corporate law
+marketing branding social media seo content photography video production
+recruitment hr training coaching mentoring fundraising venture capital angel
+investment banking microfinance insurance real estate construction architecture
+interior design solar energy renewable power engineering electrical mechanical
+civil manufacturing supply chain procurement warehousing ecommerce retail
+wholesale distribution franchising restaurants catering tourism travel hotels
+healthcare pharmacy medical devices telemedicine education tutoring elearning
+agriculture dairy poultry fisheries irrigation water treatment packaging printing""".split()
+COUNTRY_WEIGHTS = {"Pakistan": 40, "United Arab Emirates": 8, "Saudi Arabia": 8,
+                   "United Kingdom": 6, "United States": 5, "Canada": 3, "Qatar": 2}
+
+
+def _places():
+    # Every gazetteer city, each with its country's weight split between its cities
+    by_country = {}
+    for place in gazetteer._index()[0]:
+        by_country.setdefault(place.country, []).append(place)
+    places, weights = [], []
+    for country in sorted(by_country):
+        cities = sorted(by_country[country], key=lambda p: p.city)
+        for place in cities:
+            places.append(place)
+            weights.append(COUNTRY_WEIGHTS.get(country, 0.2) / len(cities))
+    return places, weights
+
+
+def synthetic_members(n, seed=SEED, start=1):
+    # Complete profile dicts with IDs numbered from `start`
+    rng = random.Random(seed)
+    places, weights = _places()
+    for seq in range(start, start + n):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        place = rng.choices(places, weights)[0]
+        joined = EPOCH + timedelta(seconds=rng.randrange(2 * 365 * 86400))
+        profession = rng.choice(PROFESSIONS)
+        yield {
+            'id': database.format_profile_id(seq, f"{first} {last}", joined),
+            'full_name': f"{first} {last}",
+            'email': f"{first}.{last}.{seq}@example.com".lower(),
+            'city': place.city,
+            'country': place.country,
+            'primary_phone': f"{reference_data.dial_code(place.country)} 3{rng.randrange(10**9):09d}",
+            'secondary_phone': '' if rng.random() < 0.7 else f"+1 {rng.randrange(10**10):010d}",
+            'profession': profession,
+            'expertise': f"{profession} with experience in " + ", ".join(rng.sample(SKILLS, 4)),
+            'how_to_help': "Happy to help with " + " ".join(rng.sample(SKILLS, 6)),
+            'help_needed': '' if rng.random() < 0.2 else "Looking for " + " ".join(rng.sample(SKILLS, 3)),
+            'business_url': '' if rng.random() < 0.5 else f"https://{last.lower()}{seq}.example.com",
+            'timestamp': joined.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+
+def fill_db(n, seed=SEED):
+    # Appends n synthetic members in large transactions, bypassing the save
+    # hooks, and advances the profile ID sequence past them.
+    columns = database.WRITE_COLUMNS + ("timestamp",)
+    sql = (f"INSERT INTO members ({', '.join(columns)}) "
+           f"VALUES ({', '.join('?' * len(columns))})")
+    with database.transaction() as conn:
+        first = database._reserve_profile_seqs(conn, n)
+    members = synthetic_members(n, seed, start=first)
+    for offset in range(0, n, FILL_CHUNK_ROWS):
+        with database.transaction() as conn:
+            conn.executemany(sql, (tuple(m[c] for c in columns)
+                                   for _, m in zip(range(min(FILL_CHUNK_ROWS, n - offset)), members)))
+    return first
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a database with synthetic members.")
+    parser.add_argument("--members", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--db", default=database.DB_PATH)
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    database.init_db()
+    database.migrate_db()
+    first = fill_db(args.members, args.seed)
+    print(f"Added {args.members} members ({first}..{first + args.members - 1}) to {args.db}")
+
+
+if __name__ == "__main__":
+    main()
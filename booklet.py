@@ -0,0 +1,330 @@
+"""Directory booklet: every member's profile page in one PDF, or a ZIP of PDFs.
+
+    python booklet.py directory.pdf
+    python booklet.py pakistan.pdf --country Pakistan --workers 8
+    python booklet.py profiles.zip --zip
+
+Members are streamed from the database in name order and laid out in the
+main process, which numbers the pages. Chunks of laid-out profiles are
+then drawn (QR code and page) on a process pool, at most two chunks per
+worker in flight, so memory stays flat however many members there are.
+Finished chunks are appended to the output in order. The booklet is
+stitched together without a PDF library, by renumbering each chunk's
+objects, and ends with a table of contents, one bookmark per member, and
+page labels matching the printed numbers.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from io import BytesIO
+
+import database
+import pdf_generator
+from profile_cache import PROFILE_URL
+
+BOOKLET_WORKERS = int(os.environ.get("KARWAN_BOOKLET_WORKERS", os.cpu_count() or 1))
+CHUNK_PROFILES = 50
+TOC_LINES_PER_PAGE = 40
+
+BookletReport = namedtuple("BookletReport", "profiles pages seconds")
+
+# --- workers -------------------------------------------------------------------
+
+def _render_chunk(path, items):
+    # items: (profile, pages, first page number); writes one multi-page PDF
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    import qr_generator
+
+    p = canvas.Canvas(path, pagesize=letter, invariant=1)
+    for profile, pages, first_page in items:
+        qr = qr_generator.generate_qr_code(PROFILE_URL.format(profile['id']), error_correction="H")
+        pdf_generator.draw_profile(p, pages, qr, first_page_number=first_page)
+    p.save()
+    return path, len(items)
+
+def _render_files(profiles):
+    import qr_generator
+    return [(profile['id'], pdf_generator.generate_profile_pdf(
+                profile, qr_generator.generate_qr_code(PROFILE_URL.format(profile['id']),
+                                                       error_correction="H")))
+            for profile in profiles]
+
+# --- streaming ---------------------------------------------------------------
+
+@contextmanager
+def _members(filters):
+    # (total, iterator of profile dicts) read in one transaction, so the
+    # count, the page numbers and the contents all come from one snapshot
+    filter_sql, params = database._filter_sql(filters)
+    columns = ", ".join(f"m.{c}" for c in pdf_generator.PDF_FIELDS)
+    conn = database.get_connection()
+    conn.execute("BEGIN")
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM members m WHERE 1{filter_sql}", params).fetchone()[0]
+        rows = conn.execute(f"SELECT {columns} FROM members m WHERE 1{filter_sql} "
+                            f"ORDER BY m.full_name COLLATE NOCASE, m.id", params)
+        yield total, (dict(zip(pdf_generator.PDF_FIELDS, row)) for row in rows)
+    finally:
+        conn.execute("COMMIT")
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _run_pool(tasks, workers, collect):
+    # Submits (fn, *args) tasks with at most two per worker in flight and
+    # hands results to collect in submission order
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(*task))
+            while len(pending) >= 2 * workers:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+
+# --- PDF stitching -------------------------------------------------------------
+
+_REF = re.compile(rb"(\d+) 0 R")
+
+def _pdf_string(text):
+    return b"<FEFF" + text.encode("utf-16-be").hex().upper().encode() + b">"
+
+class _BookletWriter:
+    # Appends reportlab-generated PDFs to one output file. Each input's
+    # objects are copied under new numbers; its catalog, page tree and info
+    # dictionary are dropped and its pages re-parented to one page tree.
+    # Relies on reportlab's layout (uncompressed xref table, dictionaries
+    # without string values), which is all this module ever feeds it.
+    CATALOG, PAGES, OUTLINES = 1, 2, 3
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = [0, 0, 0, 0]  # object number -> byte offset; 0 = free
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _new_object(self, body, number=None):
+        if number is None:
+            number = len(self.offsets)
+            self.offsets.append(0)
+        self.offsets[number] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        return number
+
+    def append(self, data):
+        # Copies one PDF's pages; returns their new object numbers in order
+        xref_at = int(re.search(rb"startxref\s+(\d+)", data[-64:]).group(1))
+        count = int(re.match(rb"xref\s+0 (\d+)", data[xref_at:]).group(1))
+        entries = re.findall(rb"(\d{10}) \d{5} ([nf])", data[xref_at:xref_at + 32 + 20 * count])
+        starts = {n: int(off) for n, (off, kind) in enumerate(entries) if kind == b"n"}
+        ends = dict(zip(sorted(starts.values()), sorted(starts.values())[1:] + [xref_at]))
+        base = len(self.offsets) - 1
+
+        def renumber(m):
+            return b"%d 0 R" % (base + int(m.group(1)))
+
+        self.offsets.extend([0] * (count - 1))
+        kids = {}
+        for number, start in starts.items():
+            body = data[start:ends[start]]
+            body = body[body.index(b"obj") + 3:body.rindex(b"endobj")].strip(b"\r\n")
+            head, sep, stream = body.partition(b"stream")
+            if re.search(rb"/Type /(Catalog|Pages|Outlines)\b", head) or b"/Producer" in head:
+                continue
+            head = _REF.sub(renumber, head)
+            if re.search(rb"/Type /Page\b", head):
+                head = re.sub(rb"/Parent \d+ 0 R", b"/Parent %d 0 R" % self.PAGES, head)
+                kids[number] = base + number
+            self._new_object(head + sep + stream, base + number)
+        # Page order is the input's page tree order, which reportlab makes
+        # the same as object order
+        return [kids[n] for n in sorted(kids)]
+
+    def finish(self, pages, bookmarks, page_labels):
+        # pages: page object numbers in reading order; bookmarks: (title,
+        # page object number); page_labels: (first page index, style) pairs
+        first_item = len(self.offsets)
+        for i, (title, page) in enumerate(bookmarks):
+            links = b""
+            if i:
+                links += b" /Prev %d 0 R" % (first_item + i - 1)
+            if i < len(bookmarks) - 1:
+                links += b" /Next %d 0 R" % (first_item + i + 1)
+            self._new_object(b"<< /Title %s /Parent %d 0 R%s /Dest [ %d 0 R /XYZ null null null ] >>"
+                             % (_pdf_string(title), self.OUTLINES, links, page))
+        outline = b"<< /Type /Outlines /Count %d" % len(bookmarks)
+        if bookmarks:
+            outline += b" /First %d 0 R /Last %d 0 R" % (first_item, first_item + len(bookmarks) - 1)
+        self._new_object(outline + b" >>", self.OUTLINES)
+
+        kids = b" ".join(b"%d 0 R" % page for page in pages)
+        self._new_object(b"<< /Type /Pages /Count %d /Kids [ %s ] >>" % (len(pages), kids), self.PAGES)
+        nums = b" ".join(b"%d << /S /%s >>" % (index, style.encode()) for index, style in page_labels)
+        self._new_object(b"<< /Type /Catalog /Pages %d 0 R /Outlines %d 0 R /PageMode /UseOutlines "
+                         b"/PageLabels << /Nums [ %s ] >> >>" % (self.PAGES, self.OUTLINES, nums),
+                         self.CATALOG)
+
+        xref_at = self.f.tell()
+        self.f.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self.f.write(b"%010d 00000 n \n" % offset if offset else b"0000000000 65535 f \n")
+        self.f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (len(self.offsets), self.CATALOG, xref_at))
+
+def _render_toc(entries, title):
+    # entries: (name, profile id, page number); returns PDF bytes
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+    for start in range(0, max(len(entries), 1), TOC_LINES_PER_PAGE):
+        y = 750
+        if start == 0:
+            p.setFont("Helvetica-Bold", 18)
+            p.drawCentredString(300, 760, title)
+            p.line(50, 750, 550, 750)
+            y = 725
+        p.setFont("Helvetica", 11)
+        for name, profile_id, page in entries[start:start + TOC_LINES_PER_PAGE]:
+            while name and stringWidth(name, "Helvetica", 11) > 330:
+                name = name[:-1]
+            p.drawString(50, y, name)
+            p.drawString(390, y, profile_id)
+            p.drawRightString(550, y, str(page))
+            y -= 17
+        p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+def _plan(members, entries):
+    # Lays out each profile and numbers its pages; yields chunk items
+    next_page = 1
+    for profile in members:
+        pages = pdf_generator.layout_profile(profile)
+        entries.append((profile['full_name'], profile['id'], next_page))
+        yield profile, pages, next_page
+        next_page += len(pages)
+
+# --- public API ----------------------------------------------------------------
+
+def build_booklet(out, filters=None, workers=BOOKLET_WORKERS, title="Karwan-e-Tijarat Directory",
+                  on_progress=None):
+    # Writes the booklet to out (a path or binary file). on_progress(done, total)
+    # is called after each chunk is appended.
+    start = time.perf_counter()
+    entries, body_pages, done = [], [], 0
+    with _members(filters) as (total, members), tempfile.TemporaryDirectory() as tmp, \
+            (open(out, "wb") if isinstance(out, (str, os.PathLike)) else nullcontext(out)) as f:
+        writer = _BookletWriter(f)
+
+        def collect(result):
+            nonlocal done
+            path, count = result
+            with open(path, "rb") as chunk:
+                body_pages.extend(writer.append(chunk.read()))
+            os.remove(path)
+            done += count
+            if on_progress:
+                on_progress(done, total)
+
+        tasks = ((_render_chunk, os.path.join(tmp, f"chunk{i}.pdf"), items)
+                 for i, items in enumerate(_chunks(_plan(members, entries), CHUNK_PROFILES)))
+        _run_pool(tasks, workers, collect)
+
+        toc_pages = writer.append(_render_toc(entries, title))
+        bookmarks = [(f"{name} ({profile_id})", body_pages[page - 1])
+                     for name, profile_id, page in entries]
+        writer.finish(toc_pages + body_pages, bookmarks, [(0, "r"), (len(toc_pages), "D")])
+    return BookletReport(len(entries), len(toc_pages) + len(body_pages), time.perf_counter() - start)
+
+def build_zip(out, filters=None, workers=BOOKLET_WORKERS, on_progress=None):
+    # One {profile id}.pdf per member in a ZIP written to out (a path or binary file)
+    start = time.perf_counter()
+    done = 0
+    with _members(filters) as (total, members), zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as archive:
+        def collect(files):
+            nonlocal done
+            for profile_id, pdf in files:
+                archive.writestr(f"{profile_id}.pdf", pdf)
+            done += len(files)
+            if on_progress:
+                on_progress(done, total)
+
+        _run_pool(((_render_files, chunk) for chunk in _chunks(members, CHUNK_PROFILES)),
+                  workers, collect)
+    return BookletReport(done, done, time.perf_counter() - start)
+
+_PROGRESS = re.compile(r"(\d+)/(\d+) profiles")
+_DONE = re.compile(r"Wrote (\d+) profiles \((\d+) pages\) .* in ([\d.]+) s")
+
+def build_in_subprocess(out, filters=None, as_zip=False, on_progress=None):
+    # Runs this module's CLI in a child process. For the Streamlit app: it
+    # swaps its script in as __main__, which spawned pool workers would
+    # re-run on startup.
+    command = [sys.executable, "-u", os.path.abspath(__file__), os.path.abspath(out),
+               "--db", os.path.abspath(database.DB_PATH)]
+    command += [f"--{k}={v}" for k, v in (filters or {}).items() if v]
+    if as_zip:
+        command.append("--zip")
+    report = None
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    with subprocess.Popen(command, stdout=subprocess.PIPE, env=env) as proc:
+        # Progress lines start with \r. Split on \r alone: universal newlines
+        # would hold each one back until the next arrives, to rule out \r\n.
+        for line in io.TextIOWrapper(proc.stdout, newline="\r"):
+            # The last progress line and the summary arrive together
+            if (match := _PROGRESS.match(line)) and on_progress:
+                on_progress(int(match[1]), int(match[2]))
+            if match := _DONE.search(line):
+                report = BookletReport(int(match[1]), int(match[2]), float(match[3]))
+    if proc.returncode or report is None:
+        raise RuntimeError(f"Booklet build failed (exit code {proc.returncode})")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out", help="output .pdf, or .zip with --zip")
+    parser.add_argument("--zip", action="store_true", help="one PDF per member instead of a booklet")
+    for column in database.FILTER_COLUMNS:
+        parser.add_argument(f"--{column}")
+    parser.add_argument("--workers", type=int, default=BOOKLET_WORKERS)
+    parser.add_argument("--db", default=database.DB_PATH)
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    database.migrate_db()
+    filters = {c: getattr(args, c) for c in database.FILTER_COLUMNS}
+    started = time.perf_counter()
+
+    def progress(done, total):
+        elapsed = time.perf_counter() - started
+        print(f"\r{done}/{total} profiles ({done / elapsed if elapsed else 0:.0f}/s)", end="",
+              flush=True)
+
+    build = build_zip if args.zip else build_booklet
+    report = build(args.out, filters=filters, workers=args.workers, on_progress=progress)
+    print(f"\nWrote {report.profiles} profiles ({report.pages} pages) to {args.out} "
+          f"in {report.seconds:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Bulk member import from CSV or XLSX.
+
+    python bulk_import.py members.csv --errors import_errors.csv
+
+Rows are read, validated and written in batches: each batch is one
+transaction, so a chamber of commerce with 100k members imports in
+seconds. Existing members are matched by email and updated in place.
+"""
+import argparse
+import csv
+import io
+import sqlite3
+import time
+from collections import namedtuple
+
+import database
+from validation import format_phone, validate_email
+
+REQUIRED_COLUMNS = ("full_name", "email", "city", "country", "primary_phone",
+                    "profession", "expertise", "how_to_help")
+OPTIONAL_COLUMNS = ("secondary_phone", "help_needed", "business_url")
+IMPORT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+BATCH_ROWS = 1000
+
+RowError = namedtuple("RowError", "line email error")
+ImportReport = namedtuple("ImportReport", "inserted updated failed seconds errors")
+
+def read_batches(source, batch_rows=BATCH_ROWS, filename=None):
+    # Yields DataFrames of up to batch_rows rows, all values as stripped-able
+    # strings. source is a path or a binary file object (e.g. an upload).
+    import pandas as pd
+    name = str(filename or source).lower()
+    if name.endswith((".xlsx", ".xlsm")):
+        yield from _read_xlsx_batches(source, batch_rows)
+    else:
+        yield from pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=batch_rows)
+
+def _read_xlsx_batches(source, batch_rows):
+    import pandas as pd
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("XLSX import needs openpyxl (pip install openpyxl)")
+    # read_only mode streams rows instead of loading the whole sheet
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+    batch = []
+    for row in rows:
+        batch.append(["" if v is None else str(v) for v in row])
+        if len(batch) == batch_rows:
+            yield pd.DataFrame(batch, columns=header)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=header)
+    workbook.close()
+
+def validate_batch(df, first_line):
+    # Column-wise checks over the whole batch; only phone formatting is per
+    # row, and format_phone is memoized per (number, country).
+    # Returns (valid profile dicts, list of RowError).
+    import pandas as pd
+    df = df.reindex(columns=IMPORT_COLUMNS, fill_value="").fillna("").astype(str)
+    df = df.apply(lambda col: col.str.strip())
+    df["email"] = df["email"].str.lower()
+    df.index = pd.RangeIndex(first_line, first_line + len(df))
+
+    problems = pd.Series("", index=df.index)
+    missing = df[list(REQUIRED_COLUMNS)].eq("")
+    has_missing = missing.any(axis=1)
+    if has_missing.any():
+        problems[has_missing] = missing[has_missing].apply(
+            lambda r: "Missing required fields: " + ", ".join(r.index[r]), axis=1)
+    bad_email = ~has_missing & ~df["email"].map(validate_email)
+    problems[bad_email] = "Invalid email format"
+    duplicate = problems.eq("") & df["email"].duplicated(keep="last")
+    problems[duplicate] = "Duplicate email in file; a later row wins"
+
+    ok = problems.eq("")
+    errors = [RowError(line, email, error) for line, email, error
+              in zip(df.index[~ok], df["email"][~ok], problems[~ok])]
+    valid = df[ok]
+    valid = valid.assign(
+        primary_phone=[format_phone(n, c) for n, c in zip(valid["primary_phone"], valid["country"])],
+        secondary_phone=[format_phone(n, c) if n else "" for n, c in zip(valid["secondary_phone"], valid["country"])],
+    )
+    columns = list(valid.columns)
+    return [dict(zip(columns, row)) for row in valid.itertuples(index=False, name=None)], errors
+
+def import_members(source, filename=None, batch_rows=BATCH_ROWS, on_progress=None):
+    start = time.perf_counter()
+    inserted = updated = 0
+    errors = []
+    next_line = 2  # line 1 is the header
+    for df in read_batches(source, batch_rows, filename):
+        profiles, batch_errors = validate_batch(df, next_line)
+        errors.extend(batch_errors)
+        if profiles:
+            try:
+                new, changed = database.upsert_profiles_by_email(profiles)
+                inserted += new
+                updated += changed
+            except sqlite3.Error as e:
+                errors.extend(RowError(None, p["email"], f"Database error: {e}") for p in profiles)
+        next_line += len(df)
+        if on_progress:
+            on_progress(next_line - 2, inserted, updated, len(errors))
+    return ImportReport(inserted, updated, len(errors), time.perf_counter() - start, errors)
+
+def write_error_report(errors, out=None):
+    # CSV of rejected rows with their source line; returns the text.
+    out = out or io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["line", "email", "error"])
+    writer.writerows(errors)
+    return out.getvalue() if isinstance(out, io.StringIO) else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Import members from a CSV or XLSX file.")
+    parser.add_argument("file")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--errors", help="write rejected rows to this CSV file")
+    parser.add_argument("--db", default=database.DB_PATH)
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    database.init_db()
+    database.migrate_db()
+
+    def progress(rows, inserted, updated, failed):
+        print(f"\r{rows} rows read: {inserted} new, {updated} updated, {failed} rejected", end="")
+
+    report = import_members(args.file, batch_rows=args.batch_rows, on_progress=progress)
+    rows = report.inserted + report.updated + report.failed
+    print(f"\nImported {rows} rows in {report.seconds:.2f} s "
+          f"({rows / report.seconds if report.seconds else 0:.0f} rows/s)")
+    if args.errors and report.errors:
+        with open(args.errors, "w", newline="", encoding="utf-8") as f:
+            write_error_report(report.errors, f)
+        print(f"{report.failed} rejected rows written to {args.errors}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from database import get_connection, normalize_email, transaction
+from metrics import timed
+
+# Passwords live in their own table as salted scrypt hashes, never in
+# members. scrypt is deliberately slow and memory-hungry (about 16 MB and
+# tens of milliseconds per hash at these settings), so hashing runs on a
+# small bounded pool: a burst of logins queues there instead of running
+# dozens of hashes at once, and callers past HASH_QUEUE_LIMIT are turned
+# away. A successful login returns a signed session token; check_token
+# verifies the signature and then answers from an in-memory cache, so
+# reruns after the first only cost an HMAC. Member emails are public, so
+# registering needs a one-time invite code an admin issued for that email.
+SCRYPT_N = int(os.environ.get("KARWAN_SCRYPT_N", 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+HASH_WORKERS = int(os.environ.get("KARWAN_HASH_WORKERS", "2"))
+HASH_QUEUE_LIMIT = 32          # hashes admitted (running or queued) at once
+SESSION_TTL_SECONDS = 12 * 3600
+TOKEN_CACHE_SECONDS = 5 * 60   # how long a checked token is trusted without the table
+TOKEN_CACHE_SIZE = 4096
+MAX_FAILED_LOGINS = 5          # per email and per client within LOGIN_WINDOW_SECONDS
+LOGIN_WINDOW_SECONDS = 5 * 60
+MAX_TRACKED_KEYS = 10000
+INVITE_TTL_SECONDS = 7 * 24 * 3600
+INVITE_BYTES = 12
+
+# register() outcomes
+REGISTERED, ALREADY_REGISTERED, NO_PROFILE = "registered", "already registered", "no profile"
+INVALID_INVITE = "invalid invite"
+
+# Tokens signed with a per-process secret stop verifying on restart, which
+# is when Streamlit session state is lost anyway. Set the variable to share
+# tokens between processes.
+_secret = os.environ.get("KARWAN_SESSION_SECRET", "").encode() or secrets.token_bytes(32)
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="scrypt")
+_admitted = threading.BoundedSemaphore(HASH_QUEUE_LIMIT)
+_lock = threading.Lock()
+_tokens = OrderedDict()  # token -> (email, trusted until)
+_failures = {}           # limiter key -> deque of failure times
+
+
+class LoginThrottled(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    # "scrypt$n$r$p$salt$hash", so the cost can be raised without a migration
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                            maxmem=256 * n * r, dklen=HASH_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(digest)}"
+
+def _verify_hash(password, stored):
+    _, n, r, p, salt, digest = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    candidate = hashlib.scrypt(password.encode(), salt=_unb64(salt), n=n, r=r, p=p,
+                               maxmem=256 * n * r, dklen=HASH_BYTES)
+    return hmac.compare_digest(candidate, _unb64(digest))
+
+@lru_cache(maxsize=1)
+def _dummy_hash():
+    # Verified against when the email is unknown, so a miss takes as long as a hit
+    return hash_password(secrets.token_hex(8))
+
+_executor.submit(_dummy_hash)  # warmed now, so no caller ever waits on its first hash
+
+def _check_password(password, stored):
+    # Runs on the hash pool, including the dummy hash's first computation
+    return _verify_hash(password, stored or _dummy_hash())
+
+def _offload(fn, *args):
+    if not _admitted.acquire(timeout=1.0):
+        raise LoginThrottled("Too many logins in progress - try again shortly", 1)
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _admitted.release()
+
+# --- brute-force limiter ---------------------------------------------------
+
+def _recent_failures(key, now):
+    window = _failures.get(key)
+    while window and now - window[0] > LOGIN_WINDOW_SECONDS:
+        window.popleft()
+    return window
+
+def _check_limit(keys, now):
+    with _lock:
+        for key in keys:
+            window = _recent_failures(key, now)
+            if window and len(window) >= MAX_FAILED_LOGINS:
+                retry_after = int(LOGIN_WINDOW_SECONDS - (now - window[0])) + 1
+                raise LoginThrottled(f"Too many failed logins - try again in {retry_after} s",
+                                     retry_after)
+
+def _note_failure(keys, now):
+    with _lock:
+        if len(_failures) > MAX_TRACKED_KEYS:
+            for key in [k for k in _failures if not _recent_failures(k, now)]:
+                del _failures[key]
+        for key in keys:
+            _failures.setdefault(key, deque()).append(now)
+
+def _clear_failures(keys):
+    with _lock:
+        for key in keys:
+            _failures.pop(key, None)
+
+# --- session tokens ----------------------------------------------------------
+
+def _stamp(stored_hash):
+    # Changes whenever the password does, which invalidates older tokens
+    return hashlib.sha256(stored_hash.encode()).hexdigest()[:16]
+
+def _sign(payload):
+    return _b64(hmac.new(_secret, payload.encode(), hashlib.sha256).digest())
+
+def issue_token(email, stored_hash):
+    payload = f"{_b64(email.encode())}.{int(time.time()) + SESSION_TTL_SECONDS}.{_stamp(stored_hash)}"
+    token = f"{payload}.{_sign(payload)}"
+    _remember(token, email, time.time())
+    return token
+
+def _remember(token, email, now):
+    with _lock:
+        _tokens[token] = (email, now + TOKEN_CACHE_SECONDS)
+        _tokens.move_to_end(token)
+        while len(_tokens) > TOKEN_CACHE_SIZE:
+            _tokens.popitem(last=False)
+
+def check_token(token):
+    # Email the token was issued to, or None if it is forged, expired or
+    # the password has changed since
+    try:
+        encoded_email, expires, stamp, signature = token.split(".")
+        email, expires = _unb64(encoded_email).decode(), int(expires)
+    except (AttributeError, ValueError):
+        return None
+    if not hmac.compare_digest(signature, _sign(f"{encoded_email}.{expires}.{stamp}")):
+        return None
+    now = time.time()
+    if now >= expires:
+        revoke(token)
+        return None
+    with _lock:
+        cached = _tokens.get(token)
+        if cached is not None and now < cached[1]:
+            return cached[0]
+    row = get_connection().execute(
+        "SELECT password_hash FROM credentials WHERE email = ?", (email,)).fetchone()
+    if row is None or _stamp(row[0]) != stamp:
+        revoke(token)
+        return None
+    _remember(token, email, now)
+    return email
+
+def revoke(token):
+    with _lock:
+        _tokens.pop(token, None)
+
+# --- accounts ------------------------------------------------------------------
+
+def _invite_hash(code):
+    # Codes are long random strings, so a fast hash is enough at rest
+    return hashlib.sha256(code.strip().encode()).hexdigest()
+
+@timed()
+def create_invite(email):
+    # One-time code that lets the member with this email register, for an
+    # admin to pass on; replaces any earlier invite. None when no member
+    # has the email or it already has a login.
+    email = normalize_email(email)
+    code = secrets.token_urlsafe(INVITE_BYTES)
+    with transaction() as conn:
+        if conn.execute("SELECT 1 FROM credentials WHERE email = ?", (email,)).fetchone():
+            return None
+        if not conn.execute("SELECT 1 FROM members WHERE lower(email) = ?", (email,)).fetchone():
+            return None
+        conn.execute("INSERT OR REPLACE INTO invites (email, code_hash, expires_at) VALUES (?, ?, ?)",
+                     (email, _invite_hash(code), time.time() + INVITE_TTL_SECONDS))
+    return code
+
+@timed()
+def register(email, password, invite_code, client=None):
+    # Adds a login to an existing member profile, given the invite issued
+    # for its email. Returns REGISTERED, ALREADY_REGISTERED, NO_PROFILE or
+    # INVALID_INVITE; wrong codes count towards the login limiter.
+    email = normalize_email(email)
+    keys = [("email", email)] + ([("client", client)] if client else [])
+    _check_limit(keys, time.monotonic())
+    conn = get_connection()
+    if conn.execute("SELECT 1 FROM credentials WHERE email = ?", (email,)).fetchone():
+        return ALREADY_REGISTERED
+    invite = conn.execute("SELECT code_hash, expires_at FROM invites WHERE email = ?",
+                          (email,)).fetchone()
+    if (invite is None or time.time() >= invite[1]
+            or not hmac.compare_digest(invite[0], _invite_hash(invite_code or ""))):
+        _note_failure(keys, time.monotonic())
+        return INVALID_INVITE
+    if not conn.execute("SELECT 1 FROM members WHERE lower(email) = ?", (email,)).fetchone():
+        return NO_PROFILE
+    stored = _offload(hash_password, password)
+    with transaction() as conn:
+        # Re-checked under the write lock: another session may have won,
+        # and the code is single-use
+        if conn.execute("SELECT 1 FROM credentials WHERE email = ?", (email,)).fetchone():
+            return ALREADY_REGISTERED
+        if conn.execute("DELETE FROM invites WHERE email = ? AND code_hash = ?",
+                        (email, invite[0])).rowcount == 0:
+            return INVALID_INVITE
+        conn.execute("INSERT INTO credentials (email, password_hash) VALUES (?, ?)",
+                     (email, stored))
+    _clear_failures(keys[:1])
+    return REGISTERED
+
+@timed()
+def login(email, password, client=None):
+    # Session token on success, None on a wrong email or password. Raises
+    # LoginThrottled after repeated failures for this email or client.
+    email = normalize_email(email)
+    keys = [("email", email)] + ([("client", client)] if client else [])
+    _check_limit(keys, time.monotonic())
+    row = get_connection().execute(
+        "SELECT password_hash FROM credentials WHERE email = ?", (email,)).fetchone()
+    if not _offload(_check_password, password, row and row[0]) or row is None:
+        _note_failure(keys, time.monotonic())
+        return None
+    _clear_failures(keys[:1])
+    return issue_token(email, row[0])
+
+@timed()
+def set_password(email, password):
+    email = normalize_email(email)
+    stored = _offload(hash_password, password)
+    with transaction() as conn:
+        conn.execute("UPDATE credentials SET password_hash = ?, updated_at = CURRENT_TIMESTAMP "
+                     "WHERE email = ?", (stored, email))
+    # Other processes stop trusting old tokens within TOKEN_CACHE_SECONDS
+    with _lock:
+        for token in [t for t, (owner, _) in _tokens.items() if owner == email]:
+            del _tokens[token]
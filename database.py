@@ -1,13 +1,119 @@
+import csv
+import importlib.util
+import io
+import json
+import os
+import re
 import sqlite3
-import pandas as pd
-import uuid
+import tempfile
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import timed
 
 DB_PATH = "karwan_tijarat.db"
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS members
+# Connection settings applied to every pooled connection
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 128
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA foreign_keys=ON",
+    # INSERT OR REPLACE only fires DELETE triggers (which keep the search
+    # index in sync) when recursive triggers are on.
+    "PRAGMA recursive_triggers=ON",
+)
+
+# Most idle connections kept per database; more are closed when returned
+POOL_MAX_IDLE = 16
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_idle = {}  # db path -> connections not checked out by any thread
+_held = {}  # connection -> (thread that checked it out, db path)
+
+def _open_connection(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000,
+                           isolation_level=None, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def _check_in(conn, path):
+    idle = _idle.setdefault(path, [])
+    if len(idle) < POOL_MAX_IDLE and not conn.in_transaction:
+        idle.append(conn)
+    else:
+        conn.close()
+
+def _reclaim_finished_threads():
+    for conn, (thread, path) in list(_held.items()):
+        if not thread.is_alive():
+            del _held[conn]
+            _check_in(conn, path)
+
+def get_connection():
+    # Connections are shared by every thread through a checkout pool. A
+    # thread keeps the connection it checked out until it finishes; then the
+    # connection goes back to the pool. Streamlit runs each rerun on a new
+    # thread, so the next rerun picks it up with its statement cache still
+    # warm instead of opening a fresh one.
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    path = DB_PATH
+    with _pool_lock:
+        if conn is not None and _held.pop(conn, None) is not None:
+            _check_in(conn, _local.path)  # DB_PATH changed since it was checked out
+        _reclaim_finished_threads()
+        idle = _idle.get(path)
+        conn = idle.pop() if idle else None
+    if conn is None:
+        conn = _open_connection(path)
+    with _pool_lock:
+        _held[conn] = (threading.current_thread(), path)
+    _local.conn, _local.path = conn, path
+    return conn
+
+def close_all_connections():
+    with _pool_lock:
+        for conn in [*_held, *(c for idle in _idle.values() for c in idle)]:
+            conn.close()
+        _held.clear()
+        _idle.clear()
+    _local.__dict__.clear()
+
+@contextmanager
+def transaction():
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait on
+    # busy_timeout instead of failing with "database is locked" on upgrade.
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+def _fetch_one(sql, params):
+    cur = get_connection().execute(sql, params)
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip([d[0] for d in cur.description], row))
+
+def _create_members(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS members
                  (id TEXT PRIMARY KEY,
                   full_name TEXT NOT NULL,
                   email TEXT UNIQUE NOT NULL,
@@ -21,77 +127,633 @@ def init_db():
                   help_needed TEXT NOT NULL,
                   business_url TEXT,
                   timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-    conn.commit()
-    conn.close()
 
-def migrate_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
+def _add_column(conn, table, column, definition):
+    if column not in {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+SEARCH_COLUMNS = ("full_name", "profession", "expertise", "how_to_help",
+                  "help_needed", "city", "country")
+# bm25 column weights, in SEARCH_COLUMNS order: a hit in the name or
+# profession ranks above one buried in a free-text answer.
+SEARCH_WEIGHTS = (10.0, 5.0, 3.0, 1.0, 1.0, 2.0, 2.0)
+
+_fts_enabled = {}  # db path -> whether members_fts exists
+
+# members_fts is an external-content index keyed on members' implicit
+# rowid (the table's primary key is TEXT). VACUUM may renumber those
+# rowids, which would point search hits at the wrong members, so compact
+# the database only through vacuum_db, which rebuilds the index after.
+def _init_search_index(conn):
+    cols = ", ".join(SEARCH_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='members_fts'").fetchone()
     try:
-        c.execute("ALTER TABLE members ADD COLUMN help_needed TEXT NOT NULL DEFAULT ''")
-    except sqlite3.OperationalError:
-        pass
-    
-    conn.commit()
-    conn.close()
+        conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS members_fts USING fts5(
+                         {cols}, content='members', content_rowid='rowid',
+                         tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: search_profiles falls back to LIKE
+        print(f"Full-text search unavailable: {e}")
+        _fts_enabled[DB_PATH] = False
+        return
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS members_fts_ai AFTER INSERT ON members BEGIN
+                     INSERT INTO members_fts(rowid, {cols}) VALUES (new.rowid, {new_cols});
+                     END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS members_fts_ad AFTER DELETE ON members BEGIN
+                     INSERT INTO members_fts(members_fts, rowid, {cols})
+                     VALUES ('delete', old.rowid, {old_cols});
+                     END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS members_fts_au AFTER UPDATE ON members BEGIN
+                     INSERT INTO members_fts(members_fts, rowid, {cols})
+                     VALUES ('delete', old.rowid, {old_cols});
+                     INSERT INTO members_fts(rowid, {cols}) VALUES (new.rowid, {new_cols});
+                     END''')
+    if not exists:
+        # One-time backfill of members saved before the index existed
+        conn.execute("INSERT INTO members_fts(members_fts) VALUES ('rebuild')")
+    _fts_enabled[DB_PATH] = True
+
+@timed(trace_sql=True)
+def vacuum_db():
+    # VACUUM can't run inside a transaction; searches in the moment between
+    # it and the rebuild may still see old rowids. Keyset cursors held by
+    # open search pages restart from a different row.
+    get_connection().execute("VACUUM")
+    if _has_search_index():
+        with transaction() as conn:
+            conn.execute("INSERT INTO members_fts(members_fts) VALUES ('rebuild')")
+
+def _has_search_index():
+    if DB_PATH not in _fts_enabled:
+        _fts_enabled[DB_PATH] = get_connection().execute(
+            "SELECT 1 FROM sqlite_master WHERE name='members_fts'").fetchone() is not None
+    return _fts_enabled[DB_PATH]
+
+def _is_blank(search_term):
+    # Only an empty search lists everyone; one that is all punctuation
+    # ("!!!") has no FTS terms and falls back to a literal LIKE match
+    return not (search_term or "").strip()
+
+def _fts_query(search_term):
+    # Each word becomes a quoted prefix term; FTS5 ANDs them together, so
+    # "lah eng" matches a Lahore engineer. Quoting neutralises FTS syntax.
+    terms = re.findall(r"\w+", search_term.lower())
+    return " ".join(f'"{t}"*' for t in terms)
+
+def _migrate_base_schema(conn):
+    # Everything that existed before versioned migrations; each step is
+    # idempotent, so databases created by any earlier release converge.
+    _create_members(conn)
+    _add_column(conn, "members", "help_needed", "TEXT NOT NULL DEFAULT ''")
+    _init_search_index(conn)
+    _init_sequences(conn)
+    _init_geocode_cache(conn)
+    _init_locations(conn)
+
+def _migrate_secondary_indexes(conn):
+    for name, expr in (("country", "country"), ("city", "city"), ("profession", "profession"),
+                       ("timestamp", "timestamp")):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_members_{name} ON members ({expr})")
+    _init_email_index(conn)
+
+# Member counts per facet value, kept current by triggers on members so
+# filters and chips never aggregate the whole table. facet name -> key columns
+FACETS = {
+    "country": ("country",),
+    "city": ("country", "city"),
+    "profession": ("profession",),
+}
+
+def _facet_sql(name):
+    # (increment, decrement) statements for one facet, in trigger syntax
+    cols = FACETS[name]
+    key = ", ".join(cols)
+    inc = (f"INSERT INTO facet_{name} ({key}, n) VALUES ({', '.join(f'new.{c}' for c in cols)}, 1) "
+           f"ON CONFLICT({key}) DO UPDATE SET n = n + 1;")
+    match = " AND ".join(f"{c} = old.{c}" for c in cols)
+    dec = (f"UPDATE facet_{name} SET n = n - 1 WHERE {match}; "
+           f"DELETE FROM facet_{name} WHERE {match} AND n <= 0;")
+    return inc, dec
+
+def _rebuild_facet(conn, name):
+    key = ", ".join(FACETS[name])
+    conn.execute(f"DELETE FROM facet_{name}")
+    conn.execute(f"INSERT INTO facet_{name} ({key}, n) SELECT {key}, COUNT(*) FROM members GROUP BY {key}")
+
+def _migrate_facets(conn):
+    for name, cols in FACETS.items():
+        key = ", ".join(cols)
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS facet_{name}
+                     ({", ".join(f"{c} TEXT NOT NULL" for c in cols)},
+                      n INTEGER NOT NULL,
+                      PRIMARY KEY ({key})) WITHOUT ROWID''')
+        inc, dec = _facet_sql(name)
+        changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in cols)
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS facet_{name}_ai AFTER INSERT ON members BEGIN {inc} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS facet_{name}_ad AFTER DELETE ON members BEGIN {dec} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS facet_{name}_au AFTER UPDATE OF {key} ON members "
+                     f"WHEN {changed} BEGIN {dec} {inc} END")
+        _rebuild_facet(conn, name)
+
+def _migrate_credentials(conn):
+    # Logins live apart from members, as salted scrypt hashes. The old auth
+    # form's INSERT never succeeded, so there are no passwords to carry over.
+    conn.execute('''CREATE TABLE IF NOT EXISTS credentials
+                 (email TEXT PRIMARY KEY,
+                  password_hash TEXT NOT NULL,
+                  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+
+def _migrate_lowercase_emails(conn):
+    # Stores emails lower-cased wherever that can't collide with another
+    # row. Members whose emails differ only by case are left untouched and
+    # listed by email_conflicts() for an admin to merge: deleting one would
+    # break the QR code printed with its id.
+    conn.execute('''UPDATE members SET email = lower(trim(email))
+                    WHERE email != lower(trim(email)) AND lower(trim(email)) IN
+                      (SELECT lower(trim(email)) FROM members
+                       GROUP BY lower(trim(email)) HAVING COUNT(*) = 1)''')
+    conn.execute("DROP INDEX IF EXISTS idx_members_email_lower")
+    _init_email_index(conn)
+    conflicts = email_conflicts(conn)
+    if conflicts:
+        print(f"{len(conflicts)} emails are shared by several members apart from case; "
+              f"merge them from Admin Tools: {', '.join(email for email, _ in conflicts)}")
+
+# Rows of email_log kept; a reader that falls further behind reloads
+EMAIL_LOG_ROWS = 10000
+
+def _migrate_email_log(conn):
+    # Every email a member row gains, by INSERT or by UPDATE, in commit
+    # order. seq is AUTOINCREMENT, so it is never reused even after rows
+    # are pruned, and other processes can catch up from the last seq seen
+    # (see emails.py).
+    conn.execute('''CREATE TABLE IF NOT EXISTS email_log
+                 (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                  email TEXT NOT NULL)''')
+    log = ("INSERT INTO email_log (email) VALUES (lower(new.email)); "
+           f"DELETE FROM email_log WHERE seq <= last_insert_rowid() - {EMAIL_LOG_ROWS};")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS email_log_ai AFTER INSERT ON members BEGIN {log} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS email_log_au AFTER UPDATE OF email ON members "
+                 f"WHEN lower(new.email) IS NOT lower(old.email) BEGIN {log} END")
+
+def _migrate_invites(conn):
+    # One pending registration invite per member email, see credentials.py
+    conn.execute('''CREATE TABLE IF NOT EXISTS invites
+                 (email TEXT PRIMARY KEY,
+                  code_hash TEXT NOT NULL,
+                  expires_at REAL NOT NULL)''')
+
+# Applied in order; PRAGMA user_version records how many have run. Only
+# ever append to this list.
+MIGRATIONS = (
+    _migrate_base_schema,
+    _migrate_secondary_indexes,
+    _migrate_facets,
+    _migrate_credentials,
+    _migrate_lowercase_emails,
+    _migrate_email_log,
+    _migrate_invites,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_schema_ready = set()  # db paths checked by this process
+_schema_lock = threading.Lock()
+
+@timed(trace_sql=True)
+def migrate_db():
+    # Runs once per process and database; afterwards a call is a set lookup
+    if DB_PATH in _schema_ready:
+        return
+    with _schema_lock:
+        if DB_PATH in _schema_ready:
+            return
+        if get_connection().execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            for version, migration in enumerate(MIGRATIONS, start=1):
+                with transaction() as conn:
+                    # Re-read under the write lock: another process may have
+                    # applied this step since.
+                    if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                        migration(conn)
+                        conn.execute(f"PRAGMA user_version = {version}")
+        _schema_ready.add(DB_PATH)
+
+def init_db():
+    # Kept for callers that create the database before migrating it
+    migrate_db()
+
+def _init_sequences(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS sequences
+                 (name TEXT PRIMARY KEY,
+                  value INTEGER NOT NULL)''')
+    # Seed from existing members so new IDs continue the old len(df)+1 numbering
+    conn.execute('''INSERT OR IGNORE INTO sequences (name, value)
+                 SELECT 'profile_id', MAX(COUNT(*),
+                        COALESCE(MAX(CAST(substr(id, 1, instr(id, '-') - 1) AS INTEGER)), 0))
+                 FROM members''')
 
+def _init_email_index(conn):
+    # Emails compare case-insensitively. Not UNIQUE: older databases can
+    # hold emails that differ only by case (see email_conflicts), so
+    # save_profile checks for a taken email inside its transaction instead.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_members_email_lower ON members (lower(email))")
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+def email_conflicts(conn=None):
+    # [(email, [member ids])] for emails used by more than one member once
+    # case is ignored
+    rows = (conn or get_connection()).execute('''SELECT lower(trim(email)), group_concat(id, ' ')
+                         FROM members GROUP BY lower(trim(email)) HAVING COUNT(*) > 1
+                         ORDER BY 1''').fetchall()
+    return [(email, ids.split()) for email, ids in rows]
+
+def _init_geocode_cache(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS geocode_cache
+                 (query TEXT PRIMARY KEY,
+                  lat REAL,
+                  lon REAL,
+                  fetched_at REAL NOT NULL,
+                  last_used REAL NOT NULL)''')
+
+def _init_locations(conn):
+    # One row per distinct (city, country) spelling in members, resolved to
+    # coordinates once; the near-me index joins members against this.
+    conn.execute('''CREATE TABLE IF NOT EXISTS locations
+                 (city TEXT NOT NULL,
+                  country TEXT NOT NULL,
+                  lat REAL NOT NULL,
+                  lon REAL NOT NULL,
+                  PRIMARY KEY (city, country))''')
+
+def format_profile_id(seq, full_name, when=None):
+    initials = ''.join([w[0].upper() for w in full_name.split() if w])[:3]
+    date_code = (when or datetime.now()).strftime("%d%m%y")
+    return f"{seq}-{initials}-{date_code}"
+
+def _allocate_profile_id(conn, full_name):
+    # Must run inside transaction(): the write lock serialises allocators, so
+    # no two registrations can read the same value.
+    seq = conn.execute("UPDATE sequences SET value = value + 1 "
+                       "WHERE name = 'profile_id' RETURNING value").fetchone()[0]
+    return format_profile_id(seq, full_name)
+
+def _reserve_profile_seqs(conn, count):
+    # Reserves `count` consecutive sequence numbers in one statement for bulk
+    # inserts; returns the first. Same locking rules as _allocate_profile_id.
+    last = conn.execute("UPDATE sequences SET value = value + ? "
+                        "WHERE name = 'profile_id' RETURNING value", (count,)).fetchone()[0]
+    return last - count + 1
+
+@timed(trace_sql=True)
+def generate_custom_profile_id(full_name):
+    with transaction() as conn:
+        return _allocate_profile_id(conn, full_name)
+
+# Every read lists its columns, so a column added to members later never
+# leaks into a profile page, export or search result by accident.
+PROFILE_COLUMNS = ("id", "full_name", "email", "city", "country", "primary_phone",
+                   "secondary_phone", "profession", "expertise", "how_to_help",
+                   "help_needed", "business_url", "timestamp")
+ProfileRow = namedtuple("ProfileRow", PROFILE_COLUMNS)
+_ROW_SELECT = ", ".join(f"m.{c}" for c in PROFILE_COLUMNS)
+SELECT_BY_ID = f"SELECT {_ROW_SELECT} FROM members m WHERE m.id=?"
+SELECT_BY_EMAIL = f"SELECT {_ROW_SELECT} FROM members m WHERE lower(m.email) = lower(?) LIMIT 1"
+INSERT_PROFILE = '''INSERT INTO members
+                    (id, full_name, email, city, country, primary_phone,
+                     secondary_phone, profession, expertise, how_to_help,
+                     help_needed, business_url)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+# Updates in place rather than INSERT OR REPLACE, which would delete the
+# row, reset the columns a profile save doesn't carry (timestamp) and fire
+# the delete triggers
+UPSERT_PROFILE = '''INSERT INTO members
+                    (id, full_name, email, city, country, primary_phone,
+                     secondary_phone, profession, expertise, how_to_help,
+                     help_needed, business_url)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                     full_name=excluded.full_name, email=excluded.email, city=excluded.city,
+                     country=excluded.country, primary_phone=excluded.primary_phone,
+                     secondary_phone=excluded.secondary_phone, profession=excluded.profession,
+                     expertise=excluded.expertise, how_to_help=excluded.how_to_help,
+                     help_needed=excluded.help_needed, business_url=excluded.business_url'''
+UPSERT_BY_EMAIL = '''INSERT INTO members
+                     (id, full_name, email, city, country, primary_phone,
+                      secondary_phone, profession, expertise, how_to_help,
+                      help_needed, business_url)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT(email) DO UPDATE SET
+                      full_name=excluded.full_name, city=excluded.city,
+                      country=excluded.country, primary_phone=excluded.primary_phone,
+                      secondary_phone=excluded.secondary_phone, profession=excluded.profession,
+                      expertise=excluded.expertise, how_to_help=excluded.how_to_help,
+                      help_needed=excluded.help_needed, business_url=excluded.business_url'''
+
+_save_hooks = []
+
+def on_profile_saved(callback):
+    # Registers callback(profile_data) to run after every successful
+    # save_profile, e.g. to drop cached renders of that profile.
+    _save_hooks.append(callback)
+    return callback
+
+def _run_save_hooks(profile_data):
+    for hook in _save_hooks:
+        try:
+            hook(profile_data)
+        except Exception as e:
+            print(f"Save hook {hook.__name__} failed: {e}")
+
+@timed(trace_sql=True)
 def get_profile_by_id(profile_id):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM members WHERE id=?", (profile_id,))
-    result = c.fetchone()
-    conn.close()
-    return dict(result) if result else None
+    return _fetch_one(SELECT_BY_ID, (profile_id,))
 
+@timed(trace_sql=True)
 def get_profile_by_email(email):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM members WHERE email=?", (email,))
-    result = c.fetchone()
-    conn.close()
-    return dict(result) if result else None
+    return _fetch_one(SELECT_BY_EMAIL, (email,))
 
+@timed(rows=int, trace_sql=True)
 def save_profile(profile_data):
+    # A profile without an id is new: it gets the next sequence number in the
+    # same transaction and a plain INSERT, so it can never overwrite another
+    # member. The allocated id is written back into profile_data.
+    is_new = not profile_data.get('id')
+    profile_data['email'] = normalize_email(profile_data['email'])
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO members 
-                    (id, full_name, email, city, country, primary_phone, 
-                     secondary_phone, profession, expertise, how_to_help, 
-                     help_needed, business_url)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                 (profile_data['id'], profile_data['full_name'], profile_data['email'],
-                  profile_data['city'], profile_data['country'], 
-                  profile_data['primary_phone'], profile_data.get('secondary_phone', ''),
-                  profile_data['profession'], profile_data['expertise'], 
-                  profile_data['how_to_help'], profile_data.get('help_needed', ''),
-                  profile_data.get('business_url', '')))
-        conn.commit()
+        with transaction() as conn:
+            if conn.execute("SELECT 1 FROM members WHERE lower(email) = ? AND id IS NOT ?",
+                            (profile_data['email'], profile_data.get('id'))).fetchone():
+                raise sqlite3.IntegrityError(f"email {profile_data['email']} is already registered")
+            if is_new:
+                profile_data['id'] = _allocate_profile_id(conn, profile_data['full_name'])
+            conn.execute(INSERT_PROFILE if is_new else UPSERT_PROFILE,
+                     (profile_data['id'], profile_data['full_name'], profile_data['email'],
+                      profile_data['city'], profile_data['country'],
+                      profile_data['primary_phone'], profile_data.get('secondary_phone', ''),
+                      profile_data['profession'], profile_data['expertise'],
+                      profile_data['how_to_help'], profile_data.get('help_needed', ''),
+                      profile_data.get('business_url', '')))
+        _run_save_hooks(profile_data)
         return True
     except sqlite3.Error as e:
+        if is_new:
+            profile_data['id'] = None
         print(f"Database error: {e}")
         return False
-    finally:
-        conn.close()
 
+WRITE_COLUMNS = ("id", "full_name", "email", "city", "country", "primary_phone",
+                 "secondary_phone", "profession", "expertise", "how_to_help",
+                 "help_needed", "business_url")
+
+@timed(rows=sum, trace_sql=True)
+def upsert_profiles_by_email(profiles):
+    # Writes a batch of profiles in one transaction with executemany. Emails
+    # already registered keep their id and are updated in place; the rest get
+    # a block of new ids. Emails must be unique within the batch (ignoring
+    # case). Returns (inserted, updated).
+    for p in profiles:
+        p['email'] = normalize_email(p['email'])
+    emails = [p['email'] for p in profiles]
+    with transaction() as conn:
+        existing = {}
+        for i in range(0, len(emails), 500):
+            part = emails[i:i + 500]
+            existing.update(conn.execute(
+                f"SELECT lower(email), id FROM members WHERE lower(email) IN ({','.join('?' * len(part))})",
+                part).fetchall())
+        new = [p for p in profiles if p['email'] not in existing]
+        if new:
+            first_seq = _reserve_profile_seqs(conn, len(new))
+            now = datetime.now()
+            for offset, p in enumerate(new):
+                p['id'] = format_profile_id(first_seq + offset, p['full_name'], now)
+        for p in profiles:
+            if p['email'] in existing:
+                p['id'] = existing[p['email']]
+        conn.executemany(UPSERT_BY_EMAIL, (tuple(p.get(c, '') for c in WRITE_COLUMNS)
+                                           for p in profiles))
+    for p in profiles:
+        _run_save_hooks(p)
+    return len(new), len(profiles) - len(new)
+
+@timed(trace_sql=True)
 def get_all_profiles():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM members", conn)
-    conn.close()
-    return df
+    import pandas as pd
+    return pd.read_sql_query(f"SELECT {_ROW_SELECT} FROM members m", get_connection())
 
+@timed(trace_sql=True)
 def search_profiles(search_term):
-    conn = sqlite3.connect(DB_PATH)
+    import pandas as pd
+    if _is_blank(search_term):
+        return pd.read_sql_query(f"SELECT {_ROW_SELECT} FROM members m", get_connection())
+    match = _fts_query(search_term)
+    if match and _has_search_index():
+        weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+        return pd.read_sql_query(f'''SELECT {_ROW_SELECT} FROM members_fts
+                                JOIN members m ON m.rowid = members_fts.rowid
+                                WHERE members_fts MATCH ?
+                                ORDER BY bm25(members_fts, {weights})''',
+                              get_connection(), params=(match,))
+    return _search_profiles_like(search_term)
+
+LIKE_FILTER = '''(LOWER(full_name) LIKE ?
+                 OR LOWER(profession) LIKE ?
+                 OR LOWER(expertise) LIKE ?
+                 OR LOWER(city) LIKE ?
+                 OR LOWER(country) LIKE ?)'''
+
+def _search_profiles_like(search_term):
+    import pandas as pd
     query = f"%{search_term.lower()}%"
-    df = pd.read_sql_query('''SELECT * FROM members 
-                            WHERE LOWER(full_name) LIKE ? 
-                            OR LOWER(profession) LIKE ? 
-                            OR LOWER(expertise) LIKE ? 
-                            OR LOWER(city) LIKE ? 
-                            OR LOWER(country) LIKE ?''', 
-                          conn, params=(query,)*5)
-    conn.close()
-    return df
+    return pd.read_sql_query(f"SELECT {_ROW_SELECT} FROM members m WHERE {LIKE_FILTER}",
+                          get_connection(), params=(query,)*5)
+
+
+FILTER_COLUMNS = ("country", "city", "profession")
+
+def _filter_sql(filters):
+    # Exact-match facet filters, e.g. {"country": "Pakistan", "city": "Lahore"}
+    filters = {k: v for k, v in (filters or {}).items() if v}
+    unknown = set(filters) - set(FILTER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown filter: {', '.join(sorted(unknown))}")
+    return "".join(f" AND m.{k} = ?" for k in filters), list(filters.values())
+
+@timed(rows=lambda page: len(page[0]), trace_sql=True)
+def search_profiles_page(search_term, after=None, page_size=12, filters=None):
+    # Returns (rows, next_cursor). Pages are keyed on the last row's
+    # (rank, rowid) instead of an OFFSET, so deep pages cost the same as the
+    # first. Pass next_cursor back as `after`; it is None on the last page.
+    match = _fts_query(search_term)
+    filter_sql, params = _filter_sql(filters)
+    if match and _has_search_index():
+        weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+        sql = f'''SELECT {_ROW_SELECT}, s.score, m.rowid FROM
+                  (SELECT rowid, bm25(members_fts, {weights}) AS score
+                   FROM members_fts WHERE members_fts MATCH ?) s
+                  JOIN members m ON m.rowid = s.rowid WHERE 1{filter_sql}'''
+        params.insert(0, match)
+        order = "s.score, m.rowid"
+        if after is not None:
+            sql += " AND (s.score, m.rowid) > (?, ?)"
+            params.extend(after)
+    else:
+        sql = f"SELECT {_ROW_SELECT}, 0, m.rowid FROM members m WHERE 1{filter_sql}"
+        order = "m.rowid"
+        if not _is_blank(search_term):
+            sql += f" AND {LIKE_FILTER}"
+            params.extend([f"%{search_term.lower()}%"] * 5)
+        if after is not None:
+            sql += " AND m.rowid > ?"
+            params.append(after[1])
+    sql += f" ORDER BY {order} LIMIT ?"
+    params.append(page_size + 1)
+
+    rows = get_connection().execute(sql, params).fetchall()
+    next_cursor = tuple(rows[page_size - 1][-2:]) if len(rows) > page_size else None
+    return [ProfileRow._make(r[:-2]) for r in rows[:page_size]], next_cursor
+
+@timed(trace_sql=True)
+def get_profiles_by_ids(profile_ids):
+    # ProfileRows for the given ids, in the same order; missing ids are skipped
+    rows = {}
+    for i in range(0, len(profile_ids), 500):
+        part = profile_ids[i:i + 500]
+        for r in get_connection().execute(
+                f"SELECT {_ROW_SELECT} FROM members m WHERE m.id IN ({','.join('?' * len(part))})", part):
+            rows[r[0]] = ProfileRow._make(r)
+    return [rows[pid] for pid in profile_ids if pid in rows]
+
+# Filter combinations a facet table answers directly: filter keys -> facet
+_FACET_FOR_FILTERS = {frozenset(cols): name for name, cols in FACETS.items()}
+
+@timed(trace_sql=True)
+def count_profiles(search_term, filters=None):
+    match = _fts_query(search_term)
+    filter_sql, params = _filter_sql(filters)
+    if _is_blank(search_term):
+        facet = _FACET_FOR_FILTERS.get(frozenset(k for k, v in (filters or {}).items() if v))
+        if facet:
+            cols = FACETS[facet]
+            sql = f"SELECT n FROM facet_{facet} WHERE " + " AND ".join(f"{c} = ?" for c in cols)
+            row = get_connection().execute(sql, [filters[c] for c in cols]).fetchone()
+            return row[0] if row else 0
+        if not params:
+            # Summing the smallest facet beats COUNT(*) over the whole table
+            return get_connection().execute("SELECT COALESCE(SUM(n), 0) FROM facet_country").fetchone()[0]
+        sql = f"SELECT COUNT(*) FROM members m WHERE 1{filter_sql}"
+    elif match and _has_search_index():
+        sql = (f"SELECT COUNT(*) FROM members_fts JOIN members m ON m.rowid = members_fts.rowid "
+               f"WHERE members_fts MATCH ?{filter_sql}")
+        params.insert(0, match)
+    else:
+        sql = f"SELECT COUNT(*) FROM members m WHERE {LIKE_FILTER}{filter_sql}"
+        params[:0] = [f"%{search_term.lower()}%"] * 5
+    return get_connection().execute(sql, params).fetchone()[0]
+
+@timed(trace_sql=True)
+def facet_counts(name, country=None, limit=None):
+    # [(value, members)] for one facet, most common first, read from the
+    # trigger-maintained summary table. For "city", pass country to drill down.
+    col = FACETS[name][-1]
+    sql, params = f"SELECT {col}, n FROM facet_{name} WHERE {col} != ''", []
+    if name == "city" and country is not None:
+        sql += " AND country = ?"
+        params.append(country)
+    sql += f" ORDER BY n DESC, {col}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return get_connection().execute(sql, params).fetchall()
+
+@timed(trace_sql=True)
+def check_facets(repair=False):
+    # Recomputes every facet from members and diffs it against the
+    # maintained table. Returns [(facet, key, maintained n, actual n)];
+    # with repair=True, facets that differ are rebuilt in the same
+    # transaction, so nothing can change in between.
+    diffs = []
+    with transaction() as conn:
+        for name, cols in FACETS.items():
+            key = ", ".join(cols)
+            kept = {tuple(r[:-1]): r[-1] for r in conn.execute(f"SELECT {key}, n FROM facet_{name}")}
+            actual = {tuple(r[:-1]): r[-1] for r in conn.execute(
+                f"SELECT {key}, COUNT(*) FROM members GROUP BY {key}")}
+            wrong = [(name, k, kept.get(k, 0), actual.get(k, 0)) for k in sorted(kept.keys() | actual.keys())
+                     if kept.get(k, 0) != actual.get(k, 0)]
+            if wrong and repair:
+                _rebuild_facet(conn, name)
+            diffs.extend(wrong)
+    return diffs
+
+EXPORT_CHUNK_ROWS = 2000
+# format -> (mime type, file extension); parquet only when pyarrow is
+# installed, so the app never offers an export that would fail
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "jsonl": ("application/x-ndjson", ".jsonl"),
+}
+if importlib.util.find_spec("pyarrow") is not None:
+    EXPORT_FORMATS["parquet"] = ("application/vnd.apache.parquet", ".parquet")
+
+def iter_profile_chunks(chunk_size=EXPORT_CHUNK_ROWS):
+    # Steps one cursor through the table, so only chunk_size rows are in
+    # memory at a time. Under WAL the export reads a consistent snapshot
+    # without blocking concurrent saves.
+    cur = get_connection().execute(
+        f"SELECT {', '.join(PROFILE_COLUMNS)} FROM members ORDER BY rowid")
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+def _write_csv(out, chunks):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(PROFILE_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+def _write_jsonl(out, chunks):
+    for rows in chunks:
+        out.write("".join(json.dumps(dict(zip(PROFILE_COLUMNS, row)), ensure_ascii=False) + "\n"
+                          for row in rows).encode("utf-8"))
+
+def _write_parquet(out, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = pa.schema([(c, pa.string()) for c in PROFILE_COLUMNS])
+    with pq.ParquetWriter(out, schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.table([pa.array(col, pa.string()) for col in columns], schema=schema))
+
+_EXPORT_WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+@timed(trace_sql=True)
+def export_profiles(fmt, out=None, chunk_size=EXPORT_CHUNK_ROWS):
+    # Writes the members table to a binary file object chunk by chunk and
+    # returns it rewound for reading. By default that is an anonymous temp
+    # file, handed back as a read-only BufferedReader: st.download_button
+    # accepts that type but not the BufferedRandom TemporaryFile returns.
+    # Streamlit still reads the whole file into memory when it serves it.
+    if out is not None:
+        _EXPORT_WRITERS[fmt](out, iter_profile_chunks(chunk_size))
+        out.seek(0)
+        return out
+    with tempfile.TemporaryFile() as scratch:
+        _EXPORT_WRITERS[fmt](scratch, iter_profile_chunks(chunk_size))
+        scratch.flush()
+        # A duplicate descriptor keeps the unlinked file alive after close
+        reader = os.fdopen(os.dup(scratch.fileno()), "rb")
+    reader.seek(0)
+    return reader
@@ -0,0 +1,91 @@
+import threading
+
+import database
+from database import get_connection, normalize_email, on_profile_saved
+
+# "Is this email registered?" without a SQLite lookup for the usual answer.
+# A process-wide set holds every registered address (lower-cased). It is
+# kept current by the save hook and, whenever this connection's
+# data_version shows another connection has committed, by catching up on
+# email_log: a trigger-fed log of every email a member row gains, by
+# INSERT or UPDATE, whose seq is never reused. A reader that falls behind
+# the log's pruning reloads the set. An address missing from the set is
+# definitely unregistered; one in it is confirmed against the table,
+# because the set is never shrunk. On top of that, each rerun memoizes its answers, since
+# the availability box, the form and the submit check all ask about the
+# same address.
+
+_lock = threading.Lock()
+_known = None      # set of lower-cased emails
+_known_path = None
+_last_seq = 0      # highest email_log seq folded into _known
+_local = threading.local()
+
+def begin_run():
+    # Called at the top of every Streamlit rerun
+    _local.memo = {}
+
+def _memo():
+    memo = getattr(_local, "memo", None)
+    if memo is None:
+        memo = _local.memo = {}
+    return memo
+
+def _reload(conn):
+    # Called with _lock held. The log position is read first, so an email
+    # committed in between is picked up again by the next catch-up.
+    global _last_seq
+    _last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM email_log").fetchone()[0]
+    _known.clear()
+    _known.update(email for (email,) in conn.execute(
+        "SELECT lower(email) FROM members WHERE email IS NOT NULL"))
+
+def _catch_up(conn):
+    # Folds emails logged since the last look into _known. Called with _lock held.
+    global _last_seq
+    oldest = conn.execute("SELECT MIN(seq) FROM email_log").fetchone()[0]
+    if oldest is not None and oldest > _last_seq + 1:
+        _reload(conn)  # entries we never saw have been pruned
+        return
+    for seq, email in conn.execute(
+            "SELECT seq, email FROM email_log WHERE seq > ? ORDER BY seq", (_last_seq,)):
+        _known.add(email)
+        _last_seq = seq
+
+def _known_emails():
+    global _known, _known_path
+    conn = get_connection()
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    with _lock:
+        if _known is None or _known_path != database.DB_PATH:
+            _known, _known_path = set(), database.DB_PATH
+            _reload(conn)
+        elif getattr(_local, "version", None) != version:
+            _catch_up(conn)
+        _local.version = version
+        return _known
+
+def email_exists(email):
+    key = normalize_email(email)
+    if not key:
+        return False
+    memo = _memo()
+    if key not in memo:
+        if key not in _known_emails():
+            memo[key] = False
+        else:
+            memo[key] = get_connection().execute(
+                "SELECT 1 FROM members WHERE lower(email) = ? LIMIT 1", (key,)).fetchone() is not None
+    return memo[key]
+
+def note_registered(email):
+    # For member writes that bypass save_profile
+    key = normalize_email(email)
+    with _lock:
+        if _known is not None and _known_path == database.DB_PATH:
+            _known.add(key)
+    _memo().pop(key, None)
+
+@on_profile_saved
+def _on_saved(profile_data):
+    note_registered(profile_data['email'])
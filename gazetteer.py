@@ -0,0 +1,46 @@
+import csv
+import os
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.csv")
+
+Place = namedtuple("Place", "city country alpha_2 lat lon capital")
+
+def normalize(text):
+    # Case- and accent-insensitive key, so "sao" finds "São Paulo"
+    decomposed = unicodedata.normalize("NFKD", text.strip().casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+@lru_cache(maxsize=1)
+def _index():
+    # Loaded on first use and kept for the life of the process: places sorted
+    # by name plus per-country and exact-match maps. Prefix matching is left
+    # to the City selectbox, which filters its options as you type.
+    with open(GAZETTEER_PATH, newline="", encoding="utf-8") as f:
+        places = [Place(r["city"], r["country"], r["alpha_2"], float(r["lat"]),
+                        float(r["lon"]), r["capital"] == "1")
+                  for r in csv.DictReader(f)]
+    places.sort(key=lambda p: (normalize(p.city), p.country))
+    by_country, exact, capitals = {}, {}, {}
+    for p in places:
+        by_country.setdefault(p.country, []).append(p)
+        exact[(normalize(p.city), normalize(p.country))] = p
+        if p.capital:
+            capitals[normalize(p.country)] = p
+    for country_places in by_country.values():
+        country_places.sort(key=lambda p: (not p.capital, normalize(p.city)))
+    return places, by_country, exact, capitals
+
+def city_names(country=None):
+    places, by_country, _, _ = _index()
+    if country is not None:
+        return [p.city for p in by_country.get(country, [])]
+    return list(dict.fromkeys(p.city for p in places))
+
+def locate(city, country):
+    _, _, exact, capitals = _index()
+    if city:
+        return exact.get((normalize(city), normalize(country)))
+    return capitals.get(normalize(country))
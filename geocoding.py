@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import gazetteer
+from database import get_connection, transaction
+from metrics import timed, timer
+
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+CACHE_MAX_ENTRIES = 10000
+NOMINATIM_USER_AGENT = "karwan_tijarat"
+NOMINATIM_MIN_INTERVAL = 1.0  # Nominatim usage policy: at most one request per second
+
+# A single background worker keeps online lookups off the Streamlit script
+# thread and naturally serialises them for the rate limit.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocoder")
+_pending = set()
+_pending_lock = threading.Lock()
+_geolocator = None
+
+def _cache_key(city, country):
+    return f"{gazetteer.normalize(city)}|{gazetteer.normalize(country)}"
+
+@timed(rows=lambda coords: int(coords is not None))
+def geocode(city, country):
+    # Returns (lat, lon) or None without ever waiting on the network: the
+    # offline gazetteer answers first, then the persistent cache. A miss
+    # queues a background Nominatim lookup whose result a later call sees.
+    place = gazetteer.locate(city, country)
+    if place:
+        return place.lat, place.lon
+    key = _cache_key(city, country)
+    row = get_connection().execute(
+        "SELECT lat, lon, fetched_at, last_used FROM geocode_cache WHERE query=?", (key,)).fetchone()
+    now = time.time()
+    if row and now - row[2] < CACHE_TTL_SECONDS:
+        if now - row[3] > 24 * 3600:
+            # Coarse LRU bookkeeping: at most one write per entry per day
+            with transaction() as conn:
+                conn.execute("UPDATE geocode_cache SET last_used=? WHERE query=?", (now, key))
+        return (row[0], row[1]) if row[0] is not None else None
+    _schedule(key, city, country)
+    return None
+
+def _schedule(key, city, country):
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    _executor.submit(_fetch, key, city, country)
+
+def _fetch(key, city, country):
+    global _geolocator
+    try:
+        from geopy.geocoders import Nominatim
+        if _geolocator is None:
+            _geolocator = Nominatim(user_agent=NOMINATIM_USER_AGENT, timeout=5)
+        try:
+            with timer("geocoding.nominatim"):
+                location = _geolocator.geocode(f"{city}, {country}" if city else country)
+        except Exception as e:
+            print(f"Geocoding failed for {city}, {country}: {e}")
+            return
+        now = time.time()
+        with transaction() as conn:
+            # Misses are cached too (NULL coordinates) so unknown places are
+            # not re-queried on every call.
+            conn.execute('''INSERT OR REPLACE INTO geocode_cache
+                         (query, lat, lon, fetched_at, last_used) VALUES (?, ?, ?, ?, ?)''',
+                         (key, location.latitude if location else None,
+                          location.longitude if location else None, now, now))
+            conn.execute('''DELETE FROM geocode_cache WHERE query IN
+                         (SELECT query FROM geocode_cache ORDER BY last_used DESC
+                          LIMIT -1 OFFSET ?)''', (CACHE_MAX_ENTRIES,))
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+        time.sleep(NOMINATIM_MIN_INTERVAL)
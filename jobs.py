@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pdf_generator
+import qr_generator
+
+# Post-save rendering (QR code, then the profile PDF) runs on a small
+# worker pool so the Streamlit script thread returns as soon as the row is
+# written. Threads rather than processes: the results land in the
+# in-process QR and PDF caches, which later downloads of the same profile
+# hit. Finished jobs are kept for JOB_TTL_SECONDS for the page to collect.
+JOB_WORKERS = int(os.environ.get("KARWAN_JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = 15 * 60
+
+ProfileAssets = namedtuple("ProfileAssets", "qr pdf")
+JobStatus = namedtuple("JobStatus", "state result error")  # state: queued, running, done, failed, unknown
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="render")
+_jobs = {}  # job id -> (submitted at, Future)
+_lock = threading.Lock()
+
+def render_profile_assets(profile_data, profile_url):
+    qr = qr_generator.generate_qr_code(profile_url, error_correction="H")
+    return ProfileAssets(qr, pdf_generator.get_profile_pdf(profile_data, qr))
+
+def _prune(now):
+    for job_id, (submitted, future) in list(_jobs.items()):
+        if future.done() and now - submitted > JOB_TTL_SECONDS:
+            del _jobs[job_id]
+
+def submit(fn, *args):
+    job_id = uuid.uuid4().hex
+    now = time.monotonic()
+    with _lock:
+        _prune(now)
+        _jobs[job_id] = (now, _executor.submit(fn, *args))
+    return job_id
+
+def submit_profile_assets(profile_data, profile_url):
+    # Copies the profile so later edits to the caller's dict don't leak in
+    return submit(render_profile_assets, dict(profile_data), profile_url)
+
+def status(job_id):
+    with _lock:
+        entry = _jobs.get(job_id)
+    if entry is None:
+        return JobStatus("unknown", None, None)
+    future = entry[1]
+    if not future.done():
+        return JobStatus("running" if future.running() else "queued", None, None)
+    error = future.exception()
+    if error is not None:
+        return JobStatus("failed", None, error)
+    return JobStatus("done", future.result(), None)
+
+def pending_count():
+    with _lock:
+        return sum(1 for _, future in _jobs.values() if not future.done())
@@ -0,0 +1,154 @@
+import math
+import re
+import threading
+from collections import Counter, namedtuple
+
+import numpy as np
+from scipy import sparse
+
+from database import get_connection, on_profile_saved
+import database
+
+# "Who can help me": a member's help_needed is matched against every other
+# member's how_to_help and expertise using TF-IDF vectors. The offer side is
+# one sparse matrix kept column-major, so a query only touches the columns
+# of its own terms.
+STOPWORDS = frozenset("""a an and are as at be by for from has have i in is it my of on or
+our the their to we with you your can will help need looking want""".split())
+# Saved profiles are patched into the live index; once this many rows have
+# been patched the index is rebuilt so the IDF weights catch up.
+REBUILD_AFTER_UPDATES = 1000
+
+Match = namedtuple("Match", "profile_id score")
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9]{2,}", (text or "").lower()) if t not in STOPWORDS]
+
+def _offer_text(profile):
+    return f"{profile.get('how_to_help') or ''} {profile.get('expertise') or ''}"
+
+def _encode(values):
+    codes = {}
+    return codes, np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int32)
+
+class MatchIndex:
+    def __init__(self, profiles):
+        # profiles: iterable of dicts with id, city, country, how_to_help, expertise
+        docs, self.ids, countries, cities = [], [], [], []
+        doc_freq = Counter()
+        for p in profiles:
+            terms = Counter(tokenize(_offer_text(p)))
+            docs.append(terms)
+            doc_freq.update(terms.keys())
+            self.ids.append(p['id'])
+            countries.append(p['country'])
+            cities.append(p['city'])
+
+        n = len(docs)
+        self.vocab = {term: col for col, term in enumerate(sorted(doc_freq))}
+        self.idf = np.ones(len(self.vocab))
+        for term, df in doc_freq.items():
+            self.idf[self.vocab[term]] = math.log((1 + n) / (1 + df)) + 1
+
+        indptr, indices, data = [0], [], []
+        for terms in docs:
+            cols, weights = self._weights(terms)
+            indices.extend(cols)
+            data.extend(weights)
+            indptr.append(len(indices))
+        self.matrix = sparse.csr_matrix((np.array(data), np.array(indices, dtype=np.int32),
+                                         np.array(indptr)), shape=(n, len(self.vocab))).tocsc()
+        self.row_of = {pid: row for row, pid in enumerate(self.ids)}
+        self.live = np.ones(n, dtype=bool)
+        # Locations as small integer codes so filters are vectorised int compares
+        self.country_codes, self.country_arr = _encode(countries)
+        self.city_codes, self.city_arr = _encode(cities)
+        # Rows added or changed since the build: id -> ({col: weight}, country, city)
+        self.overrides = {}
+
+    def _weights(self, terms):
+        # Sublinear TF * IDF, L2-normalised; terms unknown to the vocabulary
+        # are dropped until the next rebuild.
+        cols, weights = [], []
+        for term, tf in terms.items():
+            col = self.vocab.get(term)
+            if col is not None:
+                cols.append(col)
+                weights.append((1 + math.log(tf)) * self.idf[col])
+        norm = math.sqrt(sum(w * w for w in weights))
+        return cols, [w / norm for w in weights] if norm else weights
+
+    def update(self, profile):
+        row = self.row_of.get(profile['id'])
+        if row is not None:
+            self.live[row] = False
+        cols, weights = self._weights(Counter(tokenize(_offer_text(profile))))
+        self.overrides[profile['id']] = (dict(zip(cols, weights)), profile['country'], profile['city'])
+
+    def query(self, text, k=5, country=None, city=None, exclude=None):
+        cols, weights = self._weights(Counter(tokenize(text)))
+        if not cols:
+            return []
+        scores = self.matrix[:, cols] @ np.array(weights)
+        rows = np.flatnonzero(scores)
+        values = scores[rows]
+        keep = self.live[rows]
+        if country:
+            keep &= self.country_arr[rows] == self.country_codes.get(country, -1)
+        if city:
+            keep &= self.city_arr[rows] == self.city_codes.get(city, -1)
+        rows, values = rows[keep], values[keep]
+
+        candidates = []
+        if len(rows) > k:
+            top = np.argpartition(-values, k)[:k + 1]
+            rows, values = rows[top], values[top]
+        candidates.extend((self.ids[r], float(v)) for r, v in zip(rows, values))
+
+        query_vec = dict(zip(cols, weights))
+        for pid, (vec, p_country, p_city) in list(self.overrides.items()):
+            if (country and p_country != country) or (city and p_city != city):
+                continue
+            score = sum(w * vec.get(c, 0.0) for c, w in query_vec.items())
+            if score > 0:
+                candidates.append((pid, score))
+
+        candidates = [c for c in candidates if c[0] != exclude]
+        candidates.sort(key=lambda c: -c[1])
+        return [Match(pid, score) for pid, score in candidates[:k]]
+
+_index = None
+_index_path = None
+_index_lock = threading.Lock()
+
+def _load_profiles():
+    cur = get_connection().execute(
+        "SELECT id, city, country, how_to_help, expertise FROM members ORDER BY rowid")
+    columns = [d[0] for d in cur.description]
+    for row in cur:
+        yield dict(zip(columns, row))
+
+def get_index():
+    global _index, _index_path
+    with _index_lock:
+        if _index is None or _index_path != database.DB_PATH:
+            _index = MatchIndex(_load_profiles())
+            _index_path = database.DB_PATH
+        return _index
+
+@on_profile_saved
+def _update_index(profile_data):
+    # Only patch an index that already exists; one that hasn't been built
+    # yet will read the saved row when it is.
+    global _index
+    with _index_lock:
+        if _index is None or _index_path != database.DB_PATH:
+            return
+        _index.update(profile_data)
+        if len(_index.overrides) >= REBUILD_AFTER_UPDATES:
+            _index = None
+
+def suggest_connections(profile, k=5, country=None, city=None):
+    # Members whose how_to_help/expertise best answer this profile's help_needed
+    return get_index().query(profile.get('help_needed') or '', k=k, country=country,
+                             city=city, exclude=profile.get('id'))
@@ -0,0 +1,250 @@
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+# Call timing for database, rendering and geocoding calls. Off unless
+# KARWAN_METRICS=1 or enable() is called; when off, an instrumented call
+# costs one flag check.
+BUCKETS_S = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+             0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_LOG_SIZE = 200
+RECENT_RUNS = 50
+MAX_TRACED_STATEMENTS = 50
+MAX_OPEN_RUNS = 1000
+
+_enabled = os.environ.get("KARWAN_METRICS", "") == "1"
+slow_threshold_ms = float(os.environ.get("KARWAN_SLOW_QUERY_MS", "100"))
+
+SlowCall = namedtuple("SlowCall", "name ms when statements")  # statements: [(sql, [plan lines])]
+RunTotals = namedtuple("RunTotals", "started calls ms by_category")
+
+log = logging.getLogger("karwan.slow_queries")
+_lock = threading.Lock()
+_stats = {}  # name -> [count, errors, rows, sum_s, max_s, bucket counts]
+slow_log = deque(maxlen=SLOW_LOG_SIZE)
+recent_runs = deque(maxlen=RECENT_RUNS)
+_open_runs = {}  # session key -> RunTotals of its rerun in progress
+_local = threading.local()
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def _count_rows(result):
+    # Rows touched, for results where that is meaningful
+    if result is None:
+        return 0
+    if isinstance(result, dict):
+        return 1
+    if isinstance(result, (list, tuple)) or hasattr(result, "shape"):
+        return len(result)
+    return None
+
+def _record(name, seconds, rows, failed, outermost):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = [0, 0, 0, 0.0, 0.0, [0] * (len(BUCKETS_S) + 1)]
+        stat[0] += 1
+        stat[1] += failed
+        stat[2] += rows or 0
+        stat[3] += seconds
+        stat[4] = max(stat[4], seconds)
+        i = 0
+        while i < len(BUCKETS_S) and seconds > BUCKETS_S[i]:
+            i += 1
+        stat[5][i] += 1
+    if outermost:
+        # Only outermost calls count towards the rerun, so a save that
+        # triggers geocoding and PDF invalidation isn't counted twice.
+        run = _current_run()
+        category = name.split(".", 1)[0]
+        calls, total = run.by_category.get(category, (0, 0.0))
+        run.by_category[category] = (calls + 1, total + seconds * 1000)
+
+def _current_run():
+    run = getattr(_local, "run", None)
+    if run is None:
+        run = _local.run = RunTotals(datetime.now(), 0, 0.0, {})
+    return run
+
+def begin_run(session_key):
+    # Called at the top of every Streamlit rerun: files the session's
+    # previous run and starts a fresh one on this thread. Reruns of one
+    # session don't share a thread, hence the key.
+    with _lock:
+        run = _open_runs.pop(session_key, None)
+        while len(_open_runs) >= MAX_OPEN_RUNS:
+            _open_runs.pop(next(iter(_open_runs)))  # sessions that have gone away
+    if run is not None and run.by_category:
+        calls = sum(c for c, _ in run.by_category.values())
+        total = sum(ms for _, ms in run.by_category.values())
+        recent_runs.append(run._replace(calls=calls, ms=total))
+    _local.run = _open_runs[session_key] = RunTotals(datetime.now(), 0, 0.0, {})
+
+def current_run():
+    return dict(_current_run().by_category)
+
+def _keep_statement(statements, sql):
+    # Only statements the call issued itself count towards the budget.
+    # SQLite reports what FTS5 and triggers run on their shadow tables
+    # (e.g. "-- SELECT sz FROM 'main'.'members_fts_docsize'") with a
+    # leading "--", and repeats the outer statement once per trigger
+    # program, so those are skipped along with transaction control.
+    if (len(statements) >= MAX_TRACED_STATEMENTS or sql.startswith("--") or sql in statements
+            or sql.lstrip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK"))):
+        return
+    statements[sql] = None
+
+@contextmanager
+def _traced(trace_sql):
+    # Tracks nesting, and for the outermost database call captures the SQL
+    # it runs so a slow one can be explained afterwards.
+    # Yields (statements or None, whether this is the outermost call);
+    # statements is a dict used as an ordered set.
+    depth = getattr(_local, "depth", 0)
+    conn = statements = None
+    if trace_sql and not getattr(_local, "tracing", False):
+        from database import get_connection
+        conn, statements = get_connection(), {}
+        conn.set_trace_callback(lambda sql: _keep_statement(statements, sql))
+        _local.tracing = True
+    _local.depth = depth + 1
+    try:
+        yield statements, depth == 0
+    finally:
+        _local.depth = depth
+        if conn is not None:
+            conn.set_trace_callback(None)
+            _local.tracing = False
+
+def _log_slow(name, seconds, statements):
+    explained = []
+    if statements:
+        from database import get_connection
+        conn = get_connection()
+        for sql in statements:
+            plan = []
+            if sql.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+                try:
+                    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                except Exception as e:
+                    plan = [f"(no plan: {e})"]
+            explained.append((sql, plan))
+    entry = SlowCall(name, seconds * 1000, datetime.now(), explained)
+    slow_log.append(entry)
+    log.warning("%s took %.1f ms%s", name, entry.ms,
+                "".join(f"\n  {sql}\n    " + "\n    ".join(plan) for sql, plan in explained))
+
+def _observe(name, fn, args, kwargs, rows, trace_sql):
+    start = time.perf_counter()
+    failed = True
+    with _traced(trace_sql) as (statements, outermost):
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+        finally:
+            seconds = time.perf_counter() - start
+            _record(name, seconds, None if failed else rows(result), failed, outermost)
+    if seconds * 1000 >= slow_threshold_ms:
+        _log_slow(name, seconds, statements)
+    return result
+
+def timed(name=None, rows=_count_rows, trace_sql=False):
+    # Decorator: records latency, row count and errors under `name`
+    # (default module.function). trace_sql attaches the statements a slow
+    # call ran, with their query plans, to the slow-query log.
+    def decorate(fn):
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            return _observe(label, fn, args, kwargs, rows, trace_sql)
+        return wrapper
+    return decorate
+
+@contextmanager
+def timer(name):
+    # Context-manager form for code that isn't a whole function
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    failed = True
+    with _traced(False) as (_, outermost):
+        try:
+            yield
+            failed = False
+        finally:
+            seconds = time.perf_counter() - start
+            _record(name, seconds, None, failed, outermost)
+    if seconds * 1000 >= slow_threshold_ms:
+        _log_slow(name, seconds, None)
+
+def quantile(buckets, q):
+    # Upper bound of the bucket holding the q-th quantile, in seconds
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    seen = 0
+    for bound, count in zip(BUCKETS_S + (float("inf"),), buckets):
+        seen += count
+        if seen >= q * total:
+            return bound
+    return float("inf")
+
+def snapshot():
+    # One row per instrumented call name, slowest total first
+    with _lock:
+        items = [(name, list(s[:5]), list(s[5])) for name, s in _stats.items()]
+    table = []
+    for name, (count, errors, rows, sum_s, max_s), buckets in items:
+        table.append({
+            'name': name, 'calls': count, 'errors': errors, 'rows': rows,
+            'total_ms': sum_s * 1000, 'mean_ms': sum_s * 1000 / count,
+            'p50_ms': quantile(buckets, 0.5) * 1000, 'p95_ms': quantile(buckets, 0.95) * 1000,
+            'max_ms': max_s * 1000,
+        })
+    table.sort(key=lambda r: -r['total_ms'])
+    return table
+
+def reset():
+    with _lock:
+        _stats.clear()
+    slow_log.clear()
+    recent_runs.clear()
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+def render_prometheus():
+    # Prometheus text exposition format (version 0.0.4)
+    with _lock:
+        items = sorted((name, list(s[:5]), list(s[5])) for name, s in _stats.items())
+    lines = ["# HELP karwan_call_duration_seconds Latency of instrumented calls.",
+             "# TYPE karwan_call_duration_seconds histogram"]
+    for name, (count, _, _, sum_s, _), buckets in items:
+        cumulative = 0
+        for bound, n in zip(BUCKETS_S + (float("inf"),), buckets):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'karwan_call_duration_seconds_bucket{{name="{_label(name)}",le="{le}"}} {cumulative}')
+        lines.append(f'karwan_call_duration_seconds_sum{{name="{_label(name)}"}} {sum_s!r}')
+        lines.append(f'karwan_call_duration_seconds_count{{name="{_label(name)}"}} {count}')
+    for metric, index, help_text in (("karwan_call_rows_total", 2, "Rows returned or written."),
+                                     ("karwan_call_errors_total", 1, "Calls that raised.")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f'{metric}{{name="{_label(name)}"}} {s[index]}' for name, s, _ in items]
+    lines += ["# HELP karwan_slow_calls Calls over the slow threshold still in the log.",
+              "# TYPE karwan_slow_calls gauge", f"karwan_slow_calls {len(slow_log)}"]
+    return "\n".join(lines) + "\n"
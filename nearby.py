@@ -0,0 +1,162 @@
+import math
+import threading
+import time
+from collections import namedtuple
+
+import database
+from database import get_connection, transaction, on_profile_saved
+from geocoding import geocode
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEG = 1.0  # grid cell size; ~111 km of latitude
+RESOLVE_RETRY_SECONDS = 60
+
+Neighbour = namedtuple("Neighbour", "profile_id distance_km")
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _cell(lat, lon):
+    lon = (lon + 180.0) % 360.0 - 180.0
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+class SpatialIndex:
+    # Uniform lat/lon grid over distinct member locations. Members in the same
+    # city share one point, so a query measures distance once per location,
+    # not once per member.
+    def __init__(self):
+        self.points = {}   # (lat, lon) -> set of profile ids
+        self.cells = {}    # grid cell -> set of (lat, lon)
+        self.point_of = {}  # profile id -> (lat, lon)
+
+    def add(self, profile_id, lat, lon):
+        self.remove(profile_id)
+        point = (lat, lon)
+        self.points.setdefault(point, set()).add(profile_id)
+        self.cells.setdefault(_cell(lat, lon), set()).add(point)
+        self.point_of[profile_id] = point
+
+    def remove(self, profile_id):
+        point = self.point_of.pop(profile_id, None)
+        if point is None:
+            return
+        members = self.points[point]
+        members.discard(profile_id)
+        if not members:
+            del self.points[point]
+            cell = self.cells[_cell(*point)]
+            cell.discard(point)
+            if not cell:
+                del self.cells[_cell(*point)]
+
+    def _cells_within(self, lat, lon, radius_km):
+        dlat = radius_km / 111.0
+        # Longitude degrees shrink towards the poles; near them scan every column
+        cos_lat = math.cos(math.radians(min(89.0, abs(lat) + dlat)))
+        dlon = 360.0 if dlat >= 90 else min(360.0, radius_km / (111.320 * cos_lat))
+        lat0, lat1 = _cell(max(-90.0, lat - dlat), 0)[0], _cell(min(90.0, lat + dlat), 0)[0]
+        n_cols = int(round(360 / CELL_DEG))
+        if dlon >= 180:
+            lons = range(-n_cols // 2, n_cols // 2)
+        else:
+            # Unwrapped column range, folded back across the antimeridian
+            start = int(math.floor((lon - dlon) / CELL_DEG))
+            end = int(math.floor((lon + dlon) / CELL_DEG))
+            lons = {(c + n_cols // 2) % n_cols - n_cols // 2 for c in range(start, end + 1)}
+        for i in range(lat0, lat1 + 1):
+            for j in lons:
+                yield i, j
+
+    def within(self, lat, lon, radius_km):
+        found = []
+        for cell in self._cells_within(lat, lon, radius_km):
+            for point in self.cells.get(cell, ()):
+                d = haversine_km(lat, lon, *point)
+                if d <= radius_km:
+                    found.extend(Neighbour(pid, d) for pid in self.points[point])
+        found.sort(key=lambda n: (n.distance_km, n.profile_id))
+        return found
+
+    def nearest(self, lat, lon, k):
+        # Grow the search radius until it holds k members: everything closer
+        # than the k-th hit is then guaranteed to be inside the circle.
+        radius = 50.0
+        while True:
+            found = self.within(lat, lon, radius)
+            if len(found) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return found[:k]
+            radius *= 2
+
+_index = None
+_index_path = None
+_unresolved = 0
+_last_resolve = 0.0
+_lock = threading.Lock()
+
+def resolve_locations():
+    # Gives coordinates to every (city, country) pair in members that doesn't
+    # have them yet. Pairs the gazetteer and geocode cache can't answer are
+    # queued for background geocoding and picked up on a later call.
+    # Returns (resolved pairs, number still unresolved).
+    missing = get_connection().execute('''SELECT DISTINCT m.city, m.country FROM members m
+                                       LEFT JOIN locations l ON l.city = m.city AND l.country = m.country
+                                       WHERE l.city IS NULL''').fetchall()
+    resolved = [(city, country, *coords) for city, country in missing
+                if (coords := geocode(city, country))]
+    if resolved:
+        with transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO locations (city, country, lat, lon) VALUES (?, ?, ?, ?)",
+                             resolved)
+    return resolved, len(missing) - len(resolved)
+
+def get_index():
+    global _index, _index_path, _unresolved, _last_resolve
+    with _lock:
+        if _index is None or _index_path != database.DB_PATH:
+            _, _unresolved = resolve_locations()
+            _last_resolve = time.monotonic()
+            index = SpatialIndex()
+            for pid, lat, lon in get_connection().execute(
+                    '''SELECT m.id, l.lat, l.lon FROM members m
+                       JOIN locations l ON l.city = m.city AND l.country = m.country'''):
+                index.add(pid, lat, lon)
+            _index, _index_path = index, database.DB_PATH
+        elif _unresolved and time.monotonic() - _last_resolve > RESOLVE_RETRY_SECONDS:
+            # Pick up places the background geocoder has answered since
+            resolved, _unresolved = resolve_locations()
+            _last_resolve = time.monotonic()
+            for city, country, lat, lon in resolved:
+                for (pid,) in get_connection().execute(
+                        "SELECT id FROM members WHERE city=? AND country=?", (city, country)):
+                    _index.add(pid, lat, lon)
+        return _index
+
+@on_profile_saved
+def _update_index(profile_data):
+    coords = geocode(profile_data['city'], profile_data['country'])
+    if coords:
+        with transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO locations (city, country, lat, lon) VALUES (?, ?, ?, ?)",
+                         (profile_data['city'], profile_data['country'], *coords))
+    with _lock:
+        if _index is None or _index_path != database.DB_PATH:
+            return
+        if coords:
+            _index.add(profile_data['id'], *coords)
+        else:
+            _index.remove(profile_data['id'])
+
+def members_near(city, country, radius_km=None, k=None):
+    # Members within radius_km of a place, or its k nearest members, closest
+    # first. Returns None if the place itself can't be located yet.
+    coords = geocode(city, country)
+    if coords is None:
+        return None
+    index = get_index()
+    if radius_km is not None:
+        found = index.within(*coords, radius_km)
+        return found[:k] if k else found
+    return index.nearest(*coords, k or 10)
@@ -1,10 +1,196 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+import hashlib
+import json
+import threading
+from collections import OrderedDict
 from io import BytesIO
 
+from database import on_profile_saved
+from metrics import timed
+
+# Bump whenever the layout of generate_profile_pdf changes, so cached PDFs
+# rendered with the old template are never served.
+PDF_TEMPLATE_VERSION = 3
+PDF_CACHE_MAX_BYTES = 32 * 1024 * 1024
+PDF_FIELDS = ("id", "full_name", "email", "city", "country", "primary_phone",
+              "secondary_phone", "profession", "expertise", "how_to_help",
+              "help_needed", "business_url")
+
+_cache = OrderedDict()  # content hash -> PDF bytes, least recently used first
+_cache_bytes = 0
+_keys_by_profile = {}  # profile id -> content hash of its cached PDF
+_lock = threading.Lock()
+
+# Page geometry (US letter, points)
+PAGE_TOP = 750
+PAGE_BOTTOM = 50
+LABEL_X = 50
+VALUE_X = 150
+RIGHT_EDGE = 550
+QR_X, QR_Y, QR_SIZE = 400, 600, 120
+FONT_SIZE = 12
+LINE_SPACING = 18
+FIELD_SPACING = 6
+
+def _fields(profile_data):
+    return [
+        ("Name", profile_data.get('full_name', '')),
+        ("Email", profile_data.get('email', '')),
+        ("Location", f"{profile_data.get('city', '')}, {profile_data.get('country', '')}"),
+        ("Primary Phone", profile_data.get('primary_phone', '')),
+        ("Secondary Phone", profile_data.get('secondary_phone', '')),
+        ("Profession", profile_data.get('profession', '')),
+        ("Expertise", profile_data.get('expertise', '')),
+        ("How I Can Help", profile_data.get('how_to_help', '')),
+        ("Help Needed", profile_data.get('help_needed', '')),
+        ("Business URL", profile_data.get('business_url', ''))
+    ]
+
+def _value_width(y, first_page):
+    # Lines level with the QR code on the first page stop short of it
+    if first_page and y + FONT_SIZE > QR_Y:
+        return QR_X - 10 - VALUE_X
+    return RIGHT_EDGE - VALUE_X
+
+def _split_word(word, width, font):
+    # Breaks a word wider than the column (a long URL) at the last character that fits
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    pieces = []
+    while len(word) > 1 and stringWidth(word, font, FONT_SIZE) > width:
+        cut = len(word) - 1
+        while cut > 1 and stringWidth(word[:cut], font, FONT_SIZE) > width:
+            cut -= 1
+        pieces.append(word[:cut])
+        word = word[cut:]
+    return pieces, word
+
+def layout_profile(profile_data):
+    # Lines wrapped by rendered width, as a list of pages, each a list of
+    # (font, x, y, text). Pure layout, so the booklet can count a profile's
+    # pages without drawing it.
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    pages, page, y = [], [], 700
+
+    def break_if_full():
+        nonlocal page, y
+        if y >= PAGE_BOTTOM:
+            return False
+        pages.append(page)
+        page, y = [], PAGE_TOP
+        return True
+
+    def emit(font, x, text):
+        nonlocal y
+        if break_if_full():
+            page.append(("Helvetica-Bold", LABEL_X, y, f"{label}:"))
+            y -= LINE_SPACING
+        page.append((font, x, y, text))
+
+    for label, value in _fields(profile_data):
+        if not value:
+            continue
+        break_if_full()  # the label shares its first value line's y
+        page.append(("Helvetica-Bold", LABEL_X, y, f"{label}:"))
+        for paragraph in str(value).split('\n'):
+            line = ""
+            for word in paragraph.split():
+                candidate = f"{line} {word}" if line else word
+                width = _value_width(y, not pages)
+                if stringWidth(candidate, "Helvetica", FONT_SIZE) <= width:
+                    line = candidate
+                    continue
+                if line:
+                    emit("Helvetica", VALUE_X, line)
+                    y -= LINE_SPACING
+                pieces, line = _split_word(word, _value_width(y, not pages), "Helvetica")
+                for piece in pieces:
+                    emit("Helvetica", VALUE_X, piece)
+                    y -= LINE_SPACING
+            emit("Helvetica", VALUE_X, line)
+            y -= LINE_SPACING
+        y -= FIELD_SPACING
+    pages.append(page)
+    return pages
+
+def draw_profile(p, pages, qr_img_bytes, first_page_number=None):
+    # Draws laid-out pages on a reportlab canvas; first_page_number, if given,
+    # prints a footer number on each page (the booklet)
+    from reportlab.lib.utils import ImageReader
+
+    for i, ops in enumerate(pages):
+        if i == 0:
+            p.setFont("Helvetica-Bold", 18)
+            p.drawCentredString(300, 780, "Karwan-e-Tijarat Profile")
+            p.line(50, 770, 550, 770)
+            if qr_img_bytes:
+                p.drawImage(ImageReader(BytesIO(qr_img_bytes)), QR_X, QR_Y, width=QR_SIZE, height=QR_SIZE)
+        for font, x, y, text in ops:
+            p.setFont(font, FONT_SIZE)
+            p.drawString(x, y, text)
+        if first_page_number is not None:
+            p.setFont("Helvetica", 9)
+            p.drawCentredString(300, 25, str(first_page_number + i))
+        p.showPage()
+
+@timed()
+def generate_profile_pdf(profile_data, qr_img_bytes):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+    draw_profile(p, layout_profile(profile_data), qr_img_bytes)
+    p.save()
+    return buffer.getvalue()
+
+def profile_hash(profile_data, qr_img_bytes=None):
+    # Covers every field the template prints, the QR image and the template
+    # version, so equal hashes mean byte-identical output.
+    content = json.dumps([PDF_TEMPLATE_VERSION] + [profile_data.get(f) for f in PDF_FIELDS])
+    digest = hashlib.sha256(content.encode())
+    if qr_img_bytes:
+        digest.update(qr_img_bytes)
+    return digest.hexdigest()
+
+@timed()
+def get_profile_pdf(profile_data, qr_img_bytes):
+    global _cache_bytes
+    key = profile_hash(profile_data, qr_img_bytes)
+    with _lock:
+        pdf = _cache.get(key)
+        if pdf is not None:
+            _cache.move_to_end(key)
+            return pdf
+
+    # Rendered without the lock; two sessions missing on the same profile at
+    # once both render, and the identical results are stored once.
+    pdf = generate_profile_pdf(profile_data, qr_img_bytes)
+    with _lock:
+        if key not in _cache:
+            _cache[key] = pdf
+            _cache_bytes += len(pdf)
+            if profile_data.get('id'):
+                _keys_by_profile[profile_data['id']] = key
+            while _cache_bytes > PDF_CACHE_MAX_BYTES and len(_cache) > 1:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= len(evicted)
+    return pdf
+
+@on_profile_saved
+def invalidate_profile(profile_data):
+    global _cache_bytes
+    with _lock:
+        key = _keys_by_profile.pop(profile_data['id'], None)
+        pdf = _cache.pop(key, None)
+        if pdf is not None:
+            _cache_bytes -= len(pdf)
+
+@timed()
 def generate_pdf(profile_data):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
     buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
+    p = canvas.Canvas(buffer, pagesize=letter, invariant=1)
     
     # Set font
     p.setFont("Helvetica-Bold", 16)
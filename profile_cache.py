@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+import database
+import qr_generator
+
+# Snapshots of profile rows for the ?profile_id= page, which QR scans at
+# events hit in bursts for the same few profiles. Each snapshot remembers
+# the PRAGMA data_version it was read at, as seen by one watcher
+# connection that never writes: any commit by any other connection (other
+# threads, other processes, the bulk import CLI) changes that number, so a
+# stale snapshot is re-read instead of served. QR bytes only depend on the
+# profile id and survive the re-read.
+PROFILE_CACHE_SIZE = 2048
+PROFILE_URL = "https://karwan-e-tijarat.streamlit.app/?profile_id={}"
+
+ProfileView = namedtuple("ProfileView", "profile qr")  # profile: read-only mapping
+
+_cache = OrderedDict()  # profile id -> [data_version, profile or None, qr or None]
+_lock = threading.Lock()
+_watcher = None
+_watcher_path = None
+_stats = {"hits": 0, "misses": 0, "stale": 0}
+
+def _data_version():
+    global _watcher, _watcher_path
+    with _lock:
+        if _watcher is None or _watcher_path != database.DB_PATH:
+            if _watcher is not None:
+                _watcher.close()
+            _watcher = sqlite3.connect(database.DB_PATH, check_same_thread=False,
+                                       isolation_level=None)
+            _watcher_path = database.DB_PATH
+            _cache.clear()
+        return _watcher.execute("PRAGMA data_version").fetchone()[0]
+
+def _lookup(profile_id, want_qr):
+    version = _data_version()
+    with _lock:
+        entry = _cache.get(profile_id)
+        if entry is not None and entry[0] == version and (entry[2] is not None or not want_qr):
+            _cache.move_to_end(profile_id)
+            _stats["hits"] += 1
+            return entry[1], entry[2]
+        _stats["stale" if entry is not None and entry[0] != version else "misses"] += 1
+        qr = entry[2] if entry is not None else None
+
+    row = database.get_profile_by_id(profile_id)
+    profile = MappingProxyType(row) if row else None
+    if profile is not None and want_qr and qr is None:
+        qr = qr_generator.generate_qr_code(PROFILE_URL.format(profile_id), error_correction="H")
+    with _lock:
+        _cache[profile_id] = [version, profile, qr]
+        _cache.move_to_end(profile_id)
+        while len(_cache) > PROFILE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return profile, qr
+
+def get_profile(profile_id):
+    # Read-only profile mapping, or None if there is no such profile
+    return _lookup(profile_id, want_qr=False)[0]
+
+def get_profile_view(profile_id):
+    # ProfileView with the QR PNG, or None if there is no such profile
+    profile, qr = _lookup(profile_id, want_qr=True)
+    return ProfileView(profile, qr) if profile is not None else None
+
+def cache_stats():
+    with _lock:
+        stats = dict(_stats, entries=len(_cache))
+    lookups = stats["hits"] + stats["misses"] + stats["stale"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        for key in _stats:
+            _stats[key] = 0
@@ -1,17 +1,112 @@
-import qrcode
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
 from io import BytesIO
 
-def generate_qr_code(url):
+from metrics import timed
+
+# PNGs are cached in memory (LRU, bounded by total bytes) and on disk under a
+# name derived from the rendering inputs, so restarts start warm. The same
+# inputs always produce the same image, so entries never need invalidating.
+QR_CACHE_DIR = os.environ.get("KARWAN_QR_CACHE_DIR", ".qr_cache")
+QR_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+def _render(url, error_correction, box_size, border):
+    import qrcode
+    levels = {
+        "L": qrcode.constants.ERROR_CORRECT_L,
+        "M": qrcode.constants.ERROR_CORRECT_M,
+        "Q": qrcode.constants.ERROR_CORRECT_Q,
+        "H": qrcode.constants.ERROR_CORRECT_H,
+    }
     qr = qrcode.QRCode(
         version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
+        error_correction=levels[error_correction],
+        box_size=box_size,
+        border=border,
     )
     qr.add_data(url)
     qr.make(fit=True)
-    
+
     img = qr.make_image(fill_color="black", back_color="white")
     buf = BytesIO()
     img.save(buf)
     return buf.getvalue()
+
+def _disk_path(key):
+    digest = hashlib.sha256("\0".join(map(str, key)).encode()).hexdigest()
+    return os.path.join(QR_CACHE_DIR, digest[:2], f"{digest}.png")
+
+def _read_disk(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_disk(path, png):
+    # Write to a temp file and rename so a concurrent reader never sees a
+    # partial PNG. A read-only or full disk just means no persistence.
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"QR cache write failed: {e}")
+
+def _remember(key, png):
+    global _cache_bytes
+    if key in _cache:
+        return
+    _cache[key] = png
+    _cache_bytes += len(png)
+    while _cache_bytes > QR_CACHE_MAX_BYTES and len(_cache) > 1:
+        _, evicted = _cache.popitem(last=False)
+        _cache_bytes -= len(evicted)
+        _stats["evictions"] += 1
+
+@timed()
+def generate_qr_code(url, error_correction="L", box_size=10, border=4):
+    key = (url, error_correction, box_size, border)
+    with _lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return png
+
+    path = _disk_path(key)
+    png = _read_disk(path)
+    if png is not None:
+        stat = "disk_hits"
+    else:
+        stat = "misses"
+        png = _render(url, error_correction, box_size, border)
+        _write_disk(path, png)
+
+    with _lock:
+        _stats[stat] += 1
+        _remember(key, png)
+    return png
+
+def cache_stats():
+    with _lock:
+        stats = dict(_stats, entries=len(_cache), bytes=_cache_bytes)
+    lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+    return stats
+
+def clear_cache():
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
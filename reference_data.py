@@ -0,0 +1,40 @@
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+DEFAULT_DIAL_CODE = "+92"  # Pakistan
+
+CountryTables = namedtuple("CountryTables", "names name_to_alpha2 alpha2_to_dial dial_to_alpha2")
+
+@lru_cache(maxsize=1)
+def country_tables():
+    # Built once per process and shared by every session and rerun. The
+    # mappings are read-only views so callers can't mutate the shared copy.
+    import phonenumbers
+    import pycountry
+
+    name_to_alpha2 = {c.name: c.alpha_2 for c in pycountry.countries if hasattr(c, 'name')}
+    alpha2_to_dial = {}
+    dial_to_alpha2 = {}
+    for alpha2 in name_to_alpha2.values():
+        code = phonenumbers.country_code_for_region(alpha2)
+        if code:
+            alpha2_to_dial[alpha2] = f"+{code}"
+            dial_to_alpha2.setdefault(f"+{code}", []).append(alpha2)
+    return CountryTables(
+        names=tuple(sorted(name_to_alpha2)),
+        name_to_alpha2=MappingProxyType(name_to_alpha2),
+        alpha2_to_dial=MappingProxyType(alpha2_to_dial),
+        dial_to_alpha2=MappingProxyType({k: tuple(sorted(v)) for k, v in dial_to_alpha2.items()}),
+    )
+
+def country_names():
+    return country_tables().names
+
+def dial_code(country_name):
+    tables = country_tables()
+    alpha2 = tables.name_to_alpha2.get(country_name)
+    return tables.alpha2_to_dial.get(alpha2, DEFAULT_DIAL_CODE)
+
+def countries_for_dial_code(code):
+    return country_tables().dial_to_alpha2.get(code, ())
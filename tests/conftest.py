@@ -0,0 +1,13 @@
+import pytest
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # A migrated database of its own for each test
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    database.init_db()
+    database.migrate_db()
+    yield database.DB_PATH
+    database.close_all_connections()
@@ -0,0 +1,58 @@
+import pytest
+
+import credentials
+import database
+
+
+@pytest.fixture
+def member(db):
+    profile = {
+        'full_name': "Ali Khan", 'email': "ali@x.com", 'city': "Lahore", 'country': "Pakistan",
+        'primary_phone': "+92 300 1111111", 'secondary_phone': '', 'profession': "Trader",
+        'expertise': "Textiles", 'how_to_help': "Sourcing", 'help_needed': '', 'business_url': '',
+    }
+    assert database.save_profile(profile)
+    yield profile
+    credentials._failures.clear()
+
+
+def test_registering_needs_the_invite_for_that_email(member):
+    assert credentials.register("ali@x.com", "pw", None) == credentials.INVALID_INVITE
+    code = credentials.create_invite("Ali@X.com")
+    assert credentials.register("ali@x.com", "pw", code + "x") == credentials.INVALID_INVITE
+    assert credentials.register(" ALI@x.com", "pw", code) == credentials.REGISTERED
+    assert credentials.check_token(credentials.login("ali@x.com", "pw")) == "ali@x.com"
+
+
+def test_invites_are_single_use(member):
+    code = credentials.create_invite("ali@x.com")
+    assert credentials.register("ali@x.com", "pw", code) == credentials.REGISTERED
+    assert credentials.register("ali@x.com", "other", code) == credentials.ALREADY_REGISTERED
+    assert credentials.create_invite("ali@x.com") is None
+    assert credentials.login("ali@x.com", "other") is None
+
+
+def test_a_new_invite_replaces_the_old_one(member):
+    first = credentials.create_invite("ali@x.com")
+    second = credentials.create_invite("ali@x.com")
+    assert credentials.register("ali@x.com", "pw", first) == credentials.INVALID_INVITE
+    assert credentials.register("ali@x.com", "pw", second) == credentials.REGISTERED
+
+
+def test_expired_invites_are_refused(member, monkeypatch):
+    code = credentials.create_invite("ali@x.com")
+    now = credentials.time.time()
+    monkeypatch.setattr(credentials.time, "time", lambda: now + credentials.INVITE_TTL_SECONDS + 1)
+    assert credentials.register("ali@x.com", "pw", code) == credentials.INVALID_INVITE
+
+
+def test_invites_only_go_to_members(db):
+    assert credentials.create_invite("nobody@x.com") is None
+
+
+def test_guessing_invite_codes_is_throttled(member):
+    credentials.create_invite("ali@x.com")
+    for attempt in range(credentials.MAX_FAILED_LOGINS):
+        assert credentials.register("ali@x.com", "pw", f"guess{attempt}") == credentials.INVALID_INVITE
+    with pytest.raises(credentials.LoginThrottled):
+        credentials.register("ali@x.com", "pw", "guess")
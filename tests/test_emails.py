@@ -0,0 +1,104 @@
+import sqlite3
+
+import database
+import emails
+
+
+def _member(email, city, phone):
+    return {
+        'full_name': "Ali Khan", 'email': email, 'city': city, 'country': "Pakistan",
+        'primary_phone': phone, 'secondary_phone': '', 'profession': "Trader",
+        'expertise': "Textiles", 'how_to_help': "Sourcing", 'help_needed': '', 'business_url': '',
+    }
+
+
+def _insert_raw(profile_id, profile):
+    # As an older release stored it: email exactly as typed
+    with database.transaction() as conn:
+        conn.execute(database.INSERT_PROFILE, (profile_id, *(profile[c] for c in database.WRITE_COLUMNS[1:])))
+
+
+def _rerun_migrations_from(version):
+    with database.transaction() as conn:
+        conn.execute(f"PRAGMA user_version = {version}")
+    database._schema_ready.discard(database.DB_PATH)
+    database.migrate_db()
+
+
+def test_migration_keeps_members_whose_emails_differ_by_case(db):
+    _insert_raw("1-AK-010124", _member("Ali@X.com", "Lahore", "+92 300 1111111"))
+    _insert_raw("2-AK-020124", _member("ali@x.com", "Karachi", "+92 300 2222222"))
+    _insert_raw("3-SB-030124", _member(" Sara@X.com", "Lahore", "+92 300 3333333"))
+    _rerun_migrations_from(database.MIGRATIONS.index(database._migrate_lowercase_emails))
+
+    ids = [r[0] for r in database.get_connection().execute("SELECT id FROM members ORDER BY id")]
+    assert ids == ["1-AK-010124", "2-AK-020124", "3-SB-030124"]
+    assert database.get_profile_by_id("3-SB-030124")['email'] == "sara@x.com"
+    assert database.email_conflicts() == [("ali@x.com", ["1-AK-010124", "2-AK-020124"])]
+
+
+def test_save_profile_rejects_an_email_taken_apart_from_case(db):
+    assert database.save_profile(_member("ali@x.com", "Lahore", "+92 300 1111111"))
+    duplicate = _member(" ALI@x.com", "Karachi", "+92 300 2222222")
+    assert not database.save_profile(duplicate)
+    assert duplicate['id'] is None
+    assert database.count_profiles("") == 1
+
+
+def test_save_profile_updates_keep_their_own_email(db):
+    profile = _member("ali@x.com", "Lahore", "+92 300 1111111")
+    assert database.save_profile(profile)
+    profile['city'] = "Karachi"
+    assert database.save_profile(profile)
+    other = _member("sara@x.com", "Lahore", "+92 300 3333333")
+    assert database.save_profile(other)
+    other['email'] = "Ali@X.com"
+    assert not database.save_profile(other)
+
+
+def _other_process_writes(sql, params):
+    # A separate connection, as another process would commit
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def test_email_exists_sees_emails_changed_by_another_process(db):
+    profile = _member("ali@x.com", "Lahore", "+92 300 1111111")
+    assert database.save_profile(profile)
+    emails.begin_run()
+    assert not emails.email_exists("khan@x.com")
+
+    _other_process_writes("UPDATE members SET email = ? WHERE id = ?", ("khan@x.com", profile['id']))
+    emails.begin_run()
+    assert emails.email_exists("KHAN@x.com")
+
+
+def test_email_exists_sees_rows_that_reuse_a_deleted_rowid(db):
+    assert database.save_profile(_member("ali@x.com", "Lahore", "+92 300 1111111"))
+    last = _member("sara@x.com", "Lahore", "+92 300 3333333")
+    assert database.save_profile(last)
+    emails.begin_run()
+    assert emails.email_exists("sara@x.com")
+
+    _other_process_writes("DELETE FROM members WHERE id = ?", (last['id'],))
+    _other_process_writes(database.INSERT_PROFILE, ("9-ZZ-010124", *(
+        _member("zara@x.com", "Lahore", "+92 300 9999999")[c] for c in database.WRITE_COLUMNS[1:])))
+    assert database.get_connection().execute(
+        "SELECT rowid FROM members WHERE id = '9-ZZ-010124'").fetchone()[0] == 2
+    emails.begin_run()
+    assert emails.email_exists("zara@x.com")
+
+
+def test_email_exists_reloads_after_the_log_is_pruned(db, monkeypatch):
+    emails.begin_run()
+    assert not emails.email_exists("member0@x.com")
+    for n in range(database.EMAIL_LOG_ROWS // 1000 + 2):
+        with database.transaction() as conn:
+            conn.execute("DELETE FROM email_log")
+            conn.execute("UPDATE sqlite_sequence SET seq = seq + 1000 WHERE name = 'email_log'")
+    _other_process_writes(database.INSERT_PROFILE, ("1-MM-010124", *(
+        _member("member0@x.com", "Lahore", "+92 300 1111111")[c] for c in database.WRITE_COLUMNS[1:])))
+    emails.begin_run()
+    assert emails.email_exists("member0@x.com")
@@ -0,0 +1,117 @@
+import threading
+
+import database
+
+
+def _member(n, country="Pakistan", city="Lahore", profession="Engineer"):
+    return {
+        'full_name': f"Member {n}", 'email': f"member{n}@example.com",
+        'city': city, 'country': country, 'primary_phone': "+92 300 0000000",
+        'secondary_phone': '', 'profession': profession, 'expertise': "Exports",
+        'how_to_help': "Mentoring", 'help_needed': '', 'business_url': '',
+    }
+
+
+def _delete(profile_id):
+    with database.transaction() as conn:
+        conn.execute("DELETE FROM members WHERE id = ?", (profile_id,))
+
+
+def test_inserts_are_counted(db):
+    database.save_profile(_member(1))
+    database.save_profile(_member(2, city="Karachi"))
+    database.save_profile(_member(3, country="UAE", city="Dubai", profession="Trader"))
+
+    assert database.check_facets() == []
+    assert database.facet_counts("country") == [("Pakistan", 2), ("UAE", 1)]
+    assert database.facet_counts("city", country="Pakistan") == [("Karachi", 1), ("Lahore", 1)]
+    assert database.facet_counts("profession") == [("Engineer", 2), ("Trader", 1)]
+
+
+def test_updates_move_members_between_values(db):
+    moving = _member(1)
+    database.save_profile(moving)
+    database.save_profile(_member(2))
+
+    moving.update(country="UAE", city="Dubai", profession="Trader")
+    database.save_profile(moving)
+    assert database.check_facets() == []
+    assert database.facet_counts("country") == [("Pakistan", 1), ("UAE", 1)]
+    assert database.facet_counts("city", country="UAE") == [("Dubai", 1)]
+    assert database.facet_counts("profession") == [("Engineer", 1), ("Trader", 1)]
+
+    # A save that leaves the facet columns alone changes no count
+    moving['expertise'] = "Logistics"
+    database.save_profile(moving)
+    assert database.facet_counts("country") == [("Pakistan", 1), ("UAE", 1)]
+
+
+def test_same_city_name_in_two_countries_is_counted_apart(db):
+    database.save_profile(_member(1, country="Pakistan", city="Hyderabad"))
+    database.save_profile(_member(2, country="India", city="Hyderabad"))
+    assert database.facet_counts("city", country="Pakistan") == [("Hyderabad", 1)]
+    assert database.facet_counts("city", country="India") == [("Hyderabad", 1)]
+
+
+def test_deletes_drop_empty_values(db):
+    first, second = _member(1), _member(2, country="UAE", city="Dubai")
+    database.save_profile(first)
+    database.save_profile(second)
+    _delete(second['id'])
+
+    assert database.check_facets() == []
+    assert database.facet_counts("country") == [("Pakistan", 1)]
+    assert database.facet_counts("city", country="UAE") == []
+    count = database.get_connection().execute(
+        "SELECT COUNT(*) FROM facet_country WHERE country = 'UAE'").fetchone()[0]
+    assert count == 0
+
+
+def test_bulk_upserts_insert_and_move(db):
+    database.save_profile(_member(1))
+    batch = [_member(1, country="UAE", city="Dubai"), _member(2), _member(3, profession="Trader")]
+    for p in batch:
+        p['id'] = None
+    assert database.upsert_profiles_by_email(batch) == (2, 1)
+
+    assert database.check_facets() == []
+    assert database.facet_counts("country") == [("Pakistan", 2), ("UAE", 1)]
+    assert database.facet_counts("profession") == [("Engineer", 2), ("Trader", 1)]
+
+
+def test_check_facets_reports_and_repairs_drift(db):
+    database.save_profile(_member(1))
+    with database.transaction() as conn:
+        conn.execute("UPDATE facet_country SET n = 5 WHERE country = 'Pakistan'")
+
+    assert database.check_facets(repair=True) == [("country", ("Pakistan",), 5, 1)]
+    assert database.check_facets() == []
+    assert database.facet_counts("country") == [("Pakistan", 1)]
+
+
+def test_concurrent_writers_keep_counts_exact(db):
+    countries = [("Pakistan", "Lahore"), ("UAE", "Dubai"), ("UK", "London")]
+
+    def writer(t):
+        mine = []
+        for i in range(20):
+            n = t * 1000 + i
+            country, city = countries[n % 3]
+            profile = _member(n, country=country, city=city)
+            database.save_profile(profile)
+            mine.append(profile)
+            if i % 4 == 3:
+                profile.update(country="UAE", city="Abu Dhabi", profession="Trader")
+                database.save_profile(profile)
+            if i % 5 == 4:
+                _delete(mine[i - 4]['id'])
+
+    threads = [threading.Thread(target=writer, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert database.check_facets() == []
+    total = database.count_profiles("")
+    assert sum(n for _, n in database.facet_counts("country")) == total == 4 * (20 - 4)
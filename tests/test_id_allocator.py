@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import database
+
+PROCESSES = 3
+THREADS = 4
+PER_WRITER = 15
+
+
+def _profile(writer, n):
+    return {
+        'full_name': f"Writer {writer} Member {n}",
+        'email': f"w{writer}-{n}@example.com",
+        'city': "Karachi",
+        'country': "Pakistan",
+        'primary_phone': "+92 300 0000000",
+        'profession': "Trader",
+        'expertise': "Textiles",
+        'how_to_help': "Sourcing",
+    }
+
+
+def _register(db_path, writer, count):
+    database.DB_PATH = db_path
+    ids = []
+    for n in range(count):
+        profile = _profile(writer, n)
+        assert database.save_profile(profile)
+        ids.append(profile['id'])
+    return ids
+
+
+def _process(db_path, first_writer, threads, per_writer):
+    results = [None] * threads
+
+    def run(i):
+        results[i] = _register(db_path, first_writer + i, per_writer)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert None not in results, "a writer thread failed"
+    return [pid for ids in results for pid in ids]
+
+
+def test_sequence_numbers_follow_registration_order(db):
+    ids = _register(db, 0, 3)
+    assert [int(pid.split('-')[0]) for pid in ids] == [1, 2, 3]
+
+
+def test_resaving_a_profile_keeps_its_id(db):
+    profile = _profile(0, 0)
+    assert database.save_profile(profile)
+    first_id = profile['id']
+    profile['profession'] = "Importer"
+    assert database.save_profile(profile)
+    assert profile['id'] == first_id
+    assert database.count_profiles("") == 1
+
+
+def test_concurrent_writers_get_distinct_ids(db):
+    # Several processes, each with several writer threads, register at once
+    with ProcessPoolExecutor(PROCESSES) as pool:
+        futures = [pool.submit(_process, db, p * THREADS, THREADS, PER_WRITER)
+                   for p in range(PROCESSES)]
+        ids = [pid for f in futures for pid in f.result()]
+
+    expected = PROCESSES * THREADS * PER_WRITER
+    assert len(set(ids)) == expected
+    assert sorted(int(pid.split('-')[0]) for pid in ids) == list(range(1, expected + 1))
+    rows = database.get_connection().execute("SELECT COUNT(*) FROM members").fetchone()[0]
+    assert rows == expected
@@ -0,0 +1,30 @@
+import database
+import metrics
+
+
+def _profile(n):
+    return {
+        'full_name': f"Ali Khan {n}", 'email': f"ali{n}@x.com", 'city': "Lahore",
+        'country': "Pakistan", 'primary_phone': "+92 300 1111111", 'secondary_phone': '',
+        'profession': "Trader", 'expertise': "Textiles", 'how_to_help': "Sourcing",
+        'help_needed': '', 'business_url': '',
+    }
+
+
+def test_trigger_and_fts_statements_dont_use_up_the_trace(db, monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", True)
+    monkeypatch.setattr(metrics, "slow_threshold_ms", 0)
+
+    @metrics.timed(name="test.bulk_save", trace_sql=True)
+    def bulk_save():
+        for n in range(10):
+            assert database.save_profile(_profile(n))
+        return database.count_profiles("")
+
+    metrics.slow_log.clear()
+    assert bulk_save() == 10
+    statements = [sql for sql, _ in metrics.slow_log[-1].statements]
+    assert not any(sql.startswith("--") or "'main'." in sql for sql in statements)
+    assert len(statements) == len(set(statements))
+    assert sum(sql.lstrip().startswith("INSERT INTO members") for sql in statements) == 10
+    assert "facet_country" in statements[-1]
@@ -0,0 +1,34 @@
+import sqlite3
+
+import database
+
+
+def test_baseline_database_converges(tmp_path, monkeypatch):
+    # The schema and data as the original release left them
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE members
+                 (id TEXT PRIMARY KEY, full_name TEXT NOT NULL, email TEXT UNIQUE NOT NULL,
+                  city TEXT NOT NULL, country TEXT NOT NULL, primary_phone TEXT NOT NULL,
+                  secondary_phone TEXT, profession TEXT NOT NULL, expertise TEXT NOT NULL,
+                  how_to_help TEXT NOT NULL, help_needed TEXT NOT NULL, business_url TEXT,
+                  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute("INSERT INTO members VALUES ('1-AK-010124', 'Ali Khan', 'Ali@X.com', 'Lahore', "
+                 "'Pakistan', '+92 300 1111111', '', 'Trader', 'Textiles', 'Sourcing', '', '', "
+                 "'2024-01-01 10:00:00')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(database, "DB_PATH", path)
+    database.migrate_db()
+    try:
+        conn = database.get_connection()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+        columns = [r[1] for r in conn.execute("PRAGMA table_info(members)")]
+        assert columns == list(database.PROFILE_COLUMNS)
+        profile = database.get_profile_by_email("ali@x.com")
+        assert (profile['id'], profile['email']) == ("1-AK-010124", "ali@x.com")
+        assert database.facet_counts("country") == [("Pakistan", 1)]
+        assert [r.id for r in database.search_profiles_page("textiles", None, 10)[0]] == ["1-AK-010124"]
+    finally:
+        database.close_all_connections()
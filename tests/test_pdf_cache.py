@@ -0,0 +1,48 @@
+import pytest
+
+import database
+import pdf_generator
+import qr_generator
+
+
+@pytest.fixture
+def profile(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(qr_generator, "QR_CACHE_DIR", str(tmp_path / "qr"))
+    profile = {
+        'full_name': "Ayesha Siddiqui", 'email': "ayesha@example.com",
+        'city': "Karachi", 'country': "Pakistan", 'primary_phone': "+92 300 1234567",
+        'secondary_phone': '', 'profession': "Textile Exporter",
+        'expertise': "Cotton yarn sourcing and export compliance " * 4,
+        'how_to_help': "Introductions to mills in Faisalabad",
+        'help_needed': "Buyers in the EU", 'business_url': "https://example.com",
+    }
+    assert database.save_profile(profile)
+    return profile
+
+
+@pytest.fixture
+def qr(profile):
+    return qr_generator.generate_qr_code(
+        f"https://karwan-e-tijarat.streamlit.app/?profile_id={profile['id']}", "H")
+
+
+def test_renders_are_deterministic(profile, qr):
+    assert pdf_generator.generate_profile_pdf(profile, qr) == pdf_generator.generate_profile_pdf(profile, qr)
+
+
+def test_cached_pdf_matches_a_fresh_render(profile, qr):
+    fresh = pdf_generator.generate_profile_pdf(profile, qr)
+    first = pdf_generator.get_profile_pdf(profile, qr)
+    cached = pdf_generator.get_profile_pdf(dict(database.get_profile_by_id(profile['id'])), qr)
+    assert first == cached == fresh
+
+
+def test_save_profile_invalidates_the_cached_pdf(profile, qr):
+    before = pdf_generator.get_profile_pdf(profile, qr)
+    profile['profession'] = "Garment Manufacturer"
+    assert database.save_profile(profile)
+    assert profile['id'] not in pdf_generator._keys_by_profile
+
+    updated = pdf_generator.get_profile_pdf(profile, qr)
+    assert updated != before
+    assert updated == pdf_generator.generate_profile_pdf(profile, qr)
@@ -0,0 +1,14 @@
+import reference_data
+
+
+def test_dial_codes_map_both_ways():
+    assert reference_data.dial_code("Pakistan") == "+92"
+    assert reference_data.countries_for_dial_code("+92") == ("PK",)
+    assert {"US", "CA"} <= set(reference_data.countries_for_dial_code("+1"))
+    assert reference_data.countries_for_dial_code("+999") == ()
+
+
+def test_every_dial_code_maps_back_to_its_country():
+    tables = reference_data.country_tables()
+    for alpha2, code in tables.alpha2_to_dial.items():
+        assert alpha2 in tables.dial_to_alpha2[code]
@@ -0,0 +1,55 @@
+import database
+
+
+def _member(n, name, profession):
+    return {
+        'full_name': name, 'email': f"member{n}@example.com", 'city': "Lahore",
+        'country': "Pakistan", 'primary_phone': "+92 300 0000000", 'secondary_phone': '',
+        'profession': profession, 'expertise': "Exports", 'how_to_help': "Mentoring",
+        'help_needed': '', 'business_url': '',
+    }
+
+
+def _names(term):
+    rows, _ = database.search_profiles_page(term, page_size=50)
+    return sorted(r.full_name for r in rows)
+
+
+def test_blank_search_lists_everyone(db):
+    database.save_profile(_member(1, "Ali Khan", "Engineer"))
+    database.save_profile(_member(2, "Sara Baig", "Trader"))
+    assert _names("  ") == ["Ali Khan", "Sara Baig"]
+    assert database.count_profiles("") == 2
+    assert len(database.search_profiles("")) == 2
+
+
+def test_punctuation_only_search_matches_nothing(db):
+    database.save_profile(_member(1, "Ali Khan", "Engineer"))
+    for term in ('"', "!!!", " - "):
+        assert _names(term) == []
+        assert database.count_profiles(term) == 0
+        assert database.search_profiles(term).empty
+
+
+def test_words_are_ranked_prefix_matches(db):
+    database.save_profile(_member(1, "Ali Khan", "Engineer"))
+    database.save_profile(_member(2, "Sara Baig", "Trader"))
+    assert _names("eng") == ["Ali Khan"]
+    assert _names("lah trad") == ["Sara Baig"]
+    assert database.count_profiles("lahore") == 2
+
+
+def test_vacuum_db_rebuilds_the_search_index(db):
+    # VACUUM may renumber members' rowids behind the index's back; here the
+    # index is emptied instead, which vacuum_db must repair the same way
+    for n in range(6):
+        database.save_profile(_member(n, f"Member {n}", f"Profession{n}"))
+    with database.transaction() as conn:
+        conn.execute("DELETE FROM members WHERE full_name IN ('Member 0', 'Member 1', 'Member 2')")
+        conn.execute("INSERT INTO members_fts(members_fts) VALUES ('delete-all')")
+    assert _names("profession5") == []
+
+    database.vacuum_db()
+    for n in range(3, 6):
+        assert _names(f"profession{n}") == [f"Member {n}"]
+    assert _names("profession1") == []
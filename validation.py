@@ -0,0 +1,29 @@
+import re
+from functools import lru_cache
+
+import reference_data
+
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+def validate_email(email):
+    # The whole string must match; shared by the profile form and bulk import
+    return EMAIL_PATTERN.fullmatch(email) is not None
+
+def get_country_phone_code(country_name):
+    return reference_data.dial_code(country_name)
+
+# Imports repeat the same few numbers and countries many times over, and
+# phonenumbers parsing is the slowest per-row step, so results are memoized.
+@lru_cache(maxsize=65536)
+def format_phone(phone_str, country_name):
+    if not phone_str: return ''
+    import phonenumbers
+    from phonenumbers import NumberParseException
+    try:
+        country_code = get_country_phone_code(country_name)
+        if not phone_str.startswith('+'):
+            phone_str = f"{country_code}{phone_str.lstrip('0')}"
+        parsed = phonenumbers.parse(phone_str, None)
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
+    except NumberParseException:
+        return phone_str